@@ -104,6 +104,14 @@ fi
 cd /home/ubuntu/user_management_app/client
 pip3 install -r requirements.txt
 
+# Clé de signature des jetons de l'API (JWT_KEYS), générée une fois sur l'instance
+install -d -m 750 -o root -g ubuntu /etc/user-management
+if [ ! -f /etc/user-management/api.env ]; then
+    echo "JWT_KEYS=k1:$(openssl rand -hex 32)" > /etc/user-management/api.env
+    chown root:ubuntu /etc/user-management/api.env
+    chmod 640 /etc/user-management/api.env
+fi
+
 # Création des services systemd pour API
 cat > /etc/systemd/system/user-management-api.service << 'EOF'
 [Unit]
@@ -118,6 +126,7 @@ ExecStart=/usr/bin/python3 /home/ubuntu/user_management_app/api/app.py
 Restart=always
 RestartSec=5
 Environment=PYTHONUNBUFFERED=1
+EnvironmentFile=/etc/user-management/api.env
 
 [Install]
 WantedBy=multi-user.target
@@ -0,0 +1,247 @@
+"""Admission control: per-class concurrency limits and login rate limits.
+
+AdmissionMiddleware sorts every request into a route class and lets at most
+`limit` requests of a class run at once in the worker. The next `queue`
+requests wait, each for at most `timeout` seconds; past that, or when the
+queue is full, the request is answered 503 with Retry-After right away. Under
+a spike the API thus sheds early, well within the client's 10 s timeout,
+instead of letting every request pile up until they all time out.
+
+ADMISSION_LIMITS sets "class=limit:queue:timeout" per class:
+
+- auth: /auth/* (login verifies a password hash)
+- bulk: /users/bulk*, /users/export
+- write: the other POST, PUT, PATCH and DELETE
+- read: the other GET
+
+A limit of 0 disables the class. /health, /metrics, the docs and the change
+stream (which has its own cap) are never queued.
+
+/auth/login is also rate-limited with token buckets per username
+(LOGIN_RATE_PER_USERNAME) and per client address (LOGIN_RATE_PER_IP), given
+as "attempts/seconds"; an empty bucket answers 429 with Retry-After. Behind a
+proxy, set FORWARDED_ALLOW_IPS (read by gunicorn and uvicorn) to the proxy so
+the client address comes from X-Forwarded-For; docker-compose.yml trusts the
+client container. Limits and buckets are per worker.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter, Gauge, Histogram
+
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "read=64:128:1,write=16:32:2,bulk=2:2:5,auth=16:64:2")
+LOGIN_RATE_PER_USERNAME = os.getenv("LOGIN_RATE_PER_USERNAME", "5/60")
+LOGIN_RATE_PER_IP = os.getenv("LOGIN_RATE_PER_IP", "20/60")
+LOGIN_RATE_MAX_KEYS = int(os.getenv("LOGIN_RATE_MAX_KEYS", "100000"))
+
+EXEMPT_PATHS = frozenset(["/health", "/metrics", "/docs", "/redoc", "/openapi.json", "/users/changes/stream"])
+READ_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+ADMISSION_IN_FLIGHT = Gauge('admission_in_flight_requests', 'Requests admitted and running', ['route_class'],
+                            multiprocess_mode='livesum')
+ADMISSION_QUEUE_DEPTH = Gauge('admission_queue_depth', 'Requests waiting for admission', ['route_class'],
+                              multiprocess_mode='livesum')
+ADMISSION_QUEUED = Counter('admission_queued_total', 'Requests that waited for admission', ['route_class'])
+ADMISSION_QUEUE_WAIT = Histogram('admission_queue_wait_seconds', 'Time queued requests waited', ['route_class'])
+ADMISSION_SHED = Counter('admission_shed_total', 'Requests answered early with 503 or 429', ['route_class', 'reason'])
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request cannot be admitted; retry_after is in seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_limits(value):
+    """{route class: (limit, queue, timeout)} from "read=64:128:1,write=16:32:2" """
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, spec = item.partition("=")
+        try:
+            limit, queue, timeout = spec.split(":")
+            limits[name.strip()] = (int(limit), int(queue), float(timeout))
+        except ValueError:
+            raise ValueError(f"ADMISSION_LIMITS expects class=limit:queue:timeout, got {item!r}")
+    return limits
+
+
+def parse_rate(value):
+    """(attempts, seconds) from "5/60" """
+    attempts, _, seconds = value.partition("/")
+    return int(attempts), float(seconds or 1)
+
+
+def route_class(method, path):
+    """Route class of a request, None when it is never queued"""
+    if path in EXEMPT_PATHS:
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/users/bulk") or path == "/users/export":
+        return "bulk"
+    return "read" if method in READ_METHODS else "write"
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders; up to `queue` waiters, each for `timeout` seconds, in FIFO order"""
+
+    def __init__(self, name, limit, queue, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def retry_after(self):
+        return max(1, math.ceil(self.timeout))
+
+    def _shed(self, reason):
+        ADMISSION_SHED.labels(route_class=self.name, reason=reason).inc()
+        return AdmissionRejected(reason, self.retry_after)
+
+    async def acquire(self):
+        """Take a slot or raise AdmissionRejected; pair with release()"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            ADMISSION_IN_FLIGHT.labels(route_class=self.name).inc()
+            return
+        if len(self._waiters) >= self.queue:
+            raise self._shed("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.labels(route_class=self.name).inc()
+        ADMISSION_QUEUE_DEPTH.labels(route_class=self.name).inc()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            if not self._granted(waiter):
+                raise self._shed("timeout")
+        except asyncio.CancelledError:
+            # Client parti pendant l'attente
+            if self._granted(waiter):
+                self.release()
+            raise
+        finally:
+            ADMISSION_QUEUE_DEPTH.labels(route_class=self.name).dec()
+            ADMISSION_QUEUE_WAIT.labels(route_class=self.name).observe(time.perf_counter() - start)
+
+    def _granted(self, waiter):
+        """True if release() handed the slot to waiter, else drop it from the queue"""
+        if waiter.done() and not waiter.cancelled():
+            return True
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        return False
+
+    def release(self):
+        # Le slot passe directement au premier en attente: active ne bouge pas
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        ADMISSION_IN_FLIGHT.labels(route_class=self.name).dec()
+
+
+def build_limiters(value=ADMISSION_LIMITS):
+    return {name: ConcurrencyLimiter(name, limit, queue, timeout)
+            for name, (limit, queue, timeout) in parse_limits(value).items() if limit > 0}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: the slot is held until the response body is sent, streams included"""
+
+    def __init__(self, app, limiters=None):
+        self.app = app
+        self.limiters = build_limiters() if limiters is None else limiters
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http":
+            limiter = self.limiters.get(route_class(scope["method"], scope["path"]))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(status_code=503, content={"detail": "Server busy, retry later"},
+                                    headers={"Retry-After": str(e.retry_after)})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+class TokenBuckets:
+    """Token bucket per key (`attempts` per `seconds`), keeping the LRU max_keys keys"""
+
+    def __init__(self, attempts, seconds, max_keys=LOGIN_RATE_MAX_KEYS, clock=time.monotonic):
+        self.burst = attempts
+        self.rate = attempts / seconds
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()  # key -> (jetons, instant)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Spend one token; 0 when allowed, else the seconds until the next token"""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                # Clé la plus ancienne oubliée: son seau repart plein
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class LoginRateLimiter:
+    def __init__(self, per_username=LOGIN_RATE_PER_USERNAME, per_ip=LOGIN_RATE_PER_IP):
+        self.usernames = TokenBuckets(*parse_rate(per_username))
+        self.ips = TokenBuckets(*parse_rate(per_ip))
+
+    def check(self, username, ip):
+        """Raise 429 when the username or the client address is out of attempts"""
+        for reason, buckets, key in (("ip", self.ips, ip), ("username", self.usernames, username.lower())):
+            if key is None:
+                continue
+            wait = buckets.take(key)
+            if wait:
+                ADMISSION_SHED.labels(route_class="auth", reason=f"rate_limited_{reason}").inc()
+                raise HTTPException(status_code=429, detail="Too many login attempts, retry later",
+                                    headers={"Retry-After": str(math.ceil(wait))})
+
+    def clear(self):
+        self.usernames.clear()
+        self.ips.clear()
+
+
+login_rate_limiter = LoginRateLimiter()
@@ -1,20 +1,30 @@
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List
-import hashlib
+from typing import Optional
 import logging
 import time
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
-
-# Configurer le logging
-logging.basicConfig(level=logging.INFO)
+from logs import setup_logging
+from admission import AdmissionMiddleware, login_rate_limiter
+from prometheus_client import Counter, Histogram, Gauge, CONTENT_TYPE_LATEST
+from backends import UserBackend, get_backend
+from hashing import HashingBusyError, password_hasher
+from metrics import REQUEST_DURATION_BUCKETS, collect_metrics, endpoint_label, method_label
+from responses import FastJSONResponse, project
+from routes.users import router as users_router
+from tokens import TokenError, require_token, token_service, unauthorized
+
+# Logs JSON écrits par un thread de fond (logs.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Prometheus metrics
 REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP Requests', ['method', 'endpoint', 'status'])
-REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request duration', ['method', 'endpoint'])
-ACTIVE_USERS = Gauge('user_management_active_users', 'Number of active users')
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request duration', ['method', 'endpoint'],
+                             buckets=REQUEST_DURATION_BUCKETS)
+# Multi-process: chaque worker publie le total qu'il a calculé, on garde le plus récent
+ACTIVE_USERS = Gauge('user_management_active_users', 'Number of active users', multiprocess_mode='livemostrecent')
 
 app = FastAPI(
     title="User Management API",
@@ -31,190 +41,121 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Modèles Pydantic
-class UserCreate(BaseModel):
-    username: str
-    email: str
-    password: str
-    first_name: str = None
-    last_name: str = None
-    role: str = "user"
+# Limites de concurrence par classe de routes: 503 + Retry-After au lieu d'une file sans fin.
+# Ajouté avant le middleware de métriques, qui l'englobe et compte donc les requêtes rejetées.
+app.add_middleware(AdmissionMiddleware)
 
+# Modèles Pydantic
 class LoginRequest(BaseModel):
     username: str
     password: str
 
-class UserResponse(BaseModel):
-    id: int
-    username: str
-    email: str
-    first_name: str = None
-    last_name: str = None
-    role: str
-    is_active: bool
-
-# Données utilisateur en mémoire pour le test
-users_db = [
-    {
-        "id": 1,
-        "username": "admin",
-        "email": "admin@example.com",
-        "password_hash": "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918",  # "admin"
-        "first_name": "Admin",
-        "last_name": "User",
-        "role": "admin",
-        "is_active": True
-    }
-]
-
-# Mettre à jour la métrique ACTIVE_USERS
-def update_active_users_gauge():
-    ACTIVE_USERS.set(len([u for u in users_db if u["is_active"]]))
-
-# Fonctions utilitaires pour le mot de passe
-def get_password_hash(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(plain_password, hashed_password):
-    return get_password_hash(plain_password) == hashed_password
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+@app.exception_handler(HashingBusyError)
+async def hashing_busy_handler(request, exc):
+    logger.warning("Password hashing saturated: %s", exc, extra={"event": "hashing.busy"})
+    return JSONResponse(status_code=503, content={"detail": "Server busy, retry later"}, headers={"Retry-After": "1"})
 
 # Middleware pour métriques
 @app.middleware("http")
 async def monitor_requests(request, call_next):
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
 
+    # Template de la route (/users/{user_id}) et non le chemin: cardinalité bornée
+    endpoint = endpoint_label(request)
+    method = method_label(request.method)
     REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.url.path,
+        method=method,
+        endpoint=endpoint,
         status=response.status_code
     ).inc()
 
     REQUEST_DURATION.labels(
-        method=request.method,
-        endpoint=request.url.path
+        method=method,
+        endpoint=endpoint
     ).observe(process_time)
 
     return response
 
 # Endpoints Prometheus
 @app.get('/metrics')
-async def metrics():
+async def metrics(backend: UserBackend = Depends(get_backend)):
+    # Calculé au scrape: valable pour tous les backends, même partagés entre workers
+    try:
+        ACTIVE_USERS.set((await backend.stats(recent=0))["active"])
+    except Exception:
+        # Base indisponible: les autres métriques restent lisibles, la jauge garde sa dernière valeur
+        logger.warning("Active users gauge not updated", exc_info=True, extra={"event": "metrics.stats_failed"})
     return Response(
-        content=generate_latest(),
+        content=collect_metrics(),
         media_type=CONTENT_TYPE_LATEST
     )
 
 # Root et health check
 @app.get("/")
 def read_root():
-    logger.info("Root endpoint called")
+    logger.info("Root endpoint called", extra={"event": "root"})
     return {"message": "User Management API is running"}
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy", "users_count": len(users_db)}
+async def health_check(backend: UserBackend = Depends(get_backend)):
+    return {"status": "healthy", "users_count": await backend.count()}
 
 # Authentification
 @app.post("/auth/login")
-def login(login_data: LoginRequest):
-    logger.info(f"Login attempt for user: {login_data.username}")
+async def login(login_data: LoginRequest, request: Request, backend: UserBackend = Depends(get_backend)):
+    logger.info("Login attempt for user: %s", login_data.username, extra={"event": "login.attempt"})
+    # 429 avant toute lecture ou vérification de hash
+    login_rate_limiter.check(login_data.username, request.client.host if request.client else None)
     
-    user = next((u for u in users_db if u["username"] == login_data.username), None)
+    user = await backend.get_by_username(login_data.username)
     
     if not user:
-        logger.warning(f"User not found: {login_data.username}")
+        logger.warning("User not found: %s", login_data.username, extra={"event": "login.failed"})
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(login_data.password, user["password_hash"]):
-        logger.warning(f"Invalid password for user: {login_data.username}")
+    valid, new_hash = await password_hasher.verify_and_update_async(login_data.password, user["password_hash"])
+    if not valid:
+        logger.warning("Invalid password for user: %s", login_data.username, extra={"event": "login.failed"})
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Paramètres de hachage changés: on met à jour le hash stocké
+        user = await backend.update(user["id"], {"password_hash": new_hash}) or user
     
-    user_response = {
-        "id": user["id"],
-        "username": user["username"],
-        "email": user["email"],
-        "first_name": user["first_name"],
-        "last_name": user["last_name"],
-        "role": user["role"],
-        "is_active": user["is_active"]
-    }
-    
-    logger.info(f"Login successful for user: {login_data.username}")
-    return user_response
-
-# Gestion des utilisateurs
-@app.get("/users/", response_model=List[UserResponse])
-def get_users():
-    logger.info("Get users endpoint called")
-    users_response = [
-        {
-            "id": u["id"],
-            "username": u["username"],
-            "email": u["email"],
-            "first_name": u["first_name"],
-            "last_name": u["last_name"],
-            "role": u["role"],
-            "is_active": u["is_active"]
-        }
-        for u in users_db
-    ]
-    return users_response
-
-@app.post("/users/", response_model=UserResponse)
-def create_user(user: UserCreate):
-    logger.info(f"Create user attempt: {user.username}")
-    
-    existing_user = next((u for u in users_db if u["username"] == user.username or u["email"] == user.email), None)
-    if existing_user:
-        logger.warning(f"User already exists: {user.username}")
-        raise HTTPException(status_code=400, detail="Username or email already exists")
-    
-    new_id = max([u["id"] for u in users_db]) + 1 if users_db else 1
-    
-    new_user = {
-        "id": new_id,
-        "username": user.username,
-        "email": user.email,
-        "password_hash": get_password_hash(user.password),
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "role": user.role,
-        "is_active": True
-    }
-    
-    users_db.append(new_user)
-    update_active_users_gauge()
-    
-    user_response = {
-        "id": new_user["id"],
-        "username": new_user["username"],
-        "email": new_user["email"],
-        "first_name": new_user["first_name"],
-        "last_name": new_user["last_name"],
-        "role": new_user["role"],
-        "is_active": new_user["is_active"]
-    }
-    
-    logger.info(f"User created successfully: {user.username}")
-    return user_response
-
-@app.delete("/users/{user_id}")
-def delete_user(user_id: int):
-    logger.info(f"Delete user attempt: {user_id}")
-    
-    user_index = next((i for i, u in enumerate(users_db) if u["id"] == user_id), None)
-    
-    if user_index is None:
-        logger.warning(f"User not found for deletion: {user_id}")
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    deleted_user = users_db.pop(user_index)
-    update_active_users_gauge()
-    logger.info(f"User deleted: {deleted_user['username']}")
-    
-    return {"message": "User deleted successfully"}
+    logger.info("Login successful for user: %s", login_data.username, extra={"event": "login.success"})
+    # Champs publics seulement (password_hash ne sort pas) et jetons d'accès/rafraîchissement
+    return FastJSONResponse({**project(user), **token_service.issue(user)})
+
+@app.post("/auth/refresh")
+async def refresh(request: RefreshRequest, backend: UserBackend = Depends(get_backend)):
+    """New token pair for a valid refresh token, which is revoked (rotation)"""
+    try:
+        claims = token_service.verify(request.refresh_token, token_type="refresh")
+    except TokenError as e:
+        raise unauthorized(e.reason)
+    # Seule relecture de l'utilisateur: rôle et désactivation pris en compte ici
+    user = await backend.get(int(claims["sub"]))
+    if user is None or not user.get("is_active", True):
+        raise unauthorized("inactive")
+    token_service.revoke(claims)
+    return token_service.issue(user)
+
+@app.post("/auth/logout")
+async def logout(request: Optional[RefreshRequest] = None, claims: dict = Depends(require_token)):
+    token_service.revoke(claims)
+    if request is not None:
+        try:
+            token_service.revoke(token_service.verify(request.refresh_token, token_type="refresh"))
+        except TokenError:
+            pass
+    return {"message": "Logged out"}
+
+# Gestion des utilisateurs: toutes les routes passent par le backend configuré
+app.include_router(users_router)
 
 # Lancer le serveur
 if __name__ == "__main__":
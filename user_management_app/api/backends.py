@@ -0,0 +1,561 @@
+"""User storage backends.
+
+Every route reaches users through the UserBackend returned by get_backend(),
+chosen with STORAGE_BACKEND:
+
+- memory: the in-process UserStore; each worker has its own users (tests, demos)
+- sqlite: a SQLite file in WAL mode (SQLITE_URL), shared by the workers of a node
+- postgresql: the DATABASE_URL database with the init.sql schema, for several nodes
+
+The SQL backends are wrapped in a CachedBackend (user_cache.py) for single-user
+lookups unless USER_CACHE_SIZE is 0.
+
+Backends exchange plain dicts with the columns of the users table,
+password_hash included; the response models decide what leaves the API.
+"""
+import asyncio
+import heapq
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, nullcontext
+from itertools import islice
+
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy import delete as sql_delete
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.pool import QueuePool
+
+import database
+from bulk import batches
+from changes import ChangeLog, change_event
+from coalesce import invalidates_reads
+from database import Base, close, commit, execute, run_sync
+from export import EXPORT_BATCH_SIZE, EXPORT_COLUMNS
+from models import PUBLIC_COLUMNS, User, UserChange
+from pagination import Page, UserFilters, paginate
+from responses import USER_FIELDS
+from search import escape_like, paginate_search, search_rank
+from store import DuplicateUserError, UserStore
+from user_cache import USER_CACHE_SIZE, CachedBackend
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+SQLITE_URL = os.getenv("SQLITE_URL", "sqlite:///users.db")
+
+# Même compte que init.sql
+ADMIN_USER = {
+    "id": 1,
+    "username": "admin",
+    "email": "admin@example.com",
+    "password_hash": "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918",  # "admin"
+    "first_name": "Admin",
+    "last_name": "User",
+    "role": "admin",
+    "is_active": True,
+}
+
+
+class UserBackend:
+    """Storage interface used by the routes; all lookups return dicts or None"""
+
+    def collection_version(self):
+        """Version bumped on every write, or None when the backend cannot tell cheaply"""
+        return None
+
+    async def count(self):
+        raise NotImplementedError
+
+    async def get(self, user_id):
+        raise NotImplementedError
+
+    async def get_by_username(self, username):
+        raise NotImplementedError
+
+    async def list_users(self, filters: UserFilters, page: Page):
+        """Return (users, next_cursor) for one keyset page"""
+        raise NotImplementedError
+
+    async def search(self, query, page: Page):
+        """Return (users, next_cursor) matching a lowercased query, by (rank, id)"""
+        raise NotImplementedError
+
+    async def stats(self, recent):
+        """Return total, active, inactive, roles and the `recent` newest users"""
+        raise NotImplementedError
+
+    def export_rows(self, filters: UserFilters):
+        """Iterable (or async iterable) of the EXPORT_COLUMNS of matching users, by id"""
+        raise NotImplementedError
+
+    async def create(self, user):
+        """Insert a user and return it; raises DuplicateUserError"""
+        raise NotImplementedError
+
+    async def import_users(self, prepared, report):
+        """Insert (row index, user) pairs, recording each outcome in the BulkReport"""
+        raise NotImplementedError
+
+    async def update(self, user_id, changes):
+        """Apply changes and return the user, None if missing; raises DuplicateUserError"""
+        raise NotImplementedError
+
+    async def delete(self, user_id):
+        """Remove a user and return it, None if missing"""
+        raise NotImplementedError
+
+    async def changes_since(self, since, limit):
+        """Return (events after version since, oldest version kept, latest version);
+        see changes.py"""
+        raise NotImplementedError
+
+    async def update_many(self, filters: UserFilters, ids, changes, dry_run=False):
+        """Apply changes to the users matching filters (and ids when not None) in one
+        statement; returns the matching ids, unchanged when dry_run"""
+        raise NotImplementedError
+
+    async def delete_many(self, filters: UserFilters, ids, dry_run=False):
+        """Delete the users matching filters (and ids when not None); returns their ids"""
+        raise NotImplementedError
+
+
+class MemoryBackend(UserBackend):
+    def __init__(self, store: UserStore):
+        self.store = store
+        # Équivalent des triggers de user_changes
+        self.changes = ChangeLog()
+
+    def collection_version(self):
+        return self.store.version
+
+    async def count(self):
+        return len(self.store)
+
+    async def get(self, user_id):
+        return self.store.get(user_id)
+
+    async def get_by_username(self, username):
+        return self.store.get_by_username(username)
+
+    async def list_users(self, filters, page):
+        if page.sort_key == "created_at":
+            after = (page.after_created_at, page.after_id) if page.cursor else None
+        else:
+            after = page.after_id
+        rows = (u for u in self.store.scan(after, page.descending, page.sort_key) if filters.matches(u))
+        return paginate(rows, page)
+
+    async def search(self, query, page):
+        after = (page.cursor["rank"], page.after_id) if page.cursor else None
+        ranked = ((search_rank(u, query), u) for u in self.store.search(query))
+        hits = (hit for hit in ranked if after is None or (hit[0], hit[1]["id"]) > after)
+        # Seuls les limit + 1 premiers sont triés, pas tous les candidats
+        return paginate_search(heapq.nsmallest(page.limit + 1, hits, key=lambda h: (h[0], h[1]["id"])), page.limit)
+
+    async def stats(self, recent):
+        stats = self.store.stats()
+        stats["inactive"] = stats["total"] - stats["active"]
+        stats["recent"] = list(islice(self.store.scan(descending=True, order="created_at"), recent))
+        return stats
+
+    def export_rows(self, filters):
+        # scan() est paresseux: les lignes sont sérialisées au fil de l'envoi
+        return (u for u in self.store.scan() if filters.matches(u))
+
+    @invalidates_reads
+    async def create(self, user):
+        created = self.store.add(user)
+        self.changes.append("created", created["id"])
+        return created
+
+    @invalidates_reads
+    async def import_users(self, prepared, report):
+        results = self.store.add_many([user for _, user in prepared])
+        for (index, user), result in zip(prepared, results):
+            if isinstance(result, DuplicateUserError):
+                report.failed(index, "Username or email already exists", user["username"])
+            else:
+                self.changes.append("created", result["id"])
+                report.created(index, result["id"], result["username"])
+
+    @invalidates_reads
+    async def update(self, user_id, changes):
+        updated = self.store.update(user_id, changes)
+        # Comme le trigger: un rehash du mot de passe n'est pas un changement
+        if updated is not None and any(c in changes for c in PUBLIC_COLUMNS):
+            self.changes.append("updated", user_id)
+        return updated
+
+    @invalidates_reads
+    async def delete(self, user_id):
+        deleted = self.store.delete(user_id)
+        if deleted is not None:
+            self.changes.append("deleted", user_id)
+        return deleted
+
+    async def changes_since(self, since, limit):
+        events, oldest, latest = self.changes.since(since, limit)
+        return [change_event(version, change_type, user_id, self.store.get(user_id))
+                for version, change_type, user_id in events], oldest, latest
+
+    @invalidates_reads
+    async def update_many(self, filters, ids, changes, dry_run=False):
+        if dry_run:
+            return [u["id"] for u in self.store.find(filters.matches, ids)]
+        updated = [u["id"] for u in self.store.update_where(filters.matches, changes, ids)]
+        if any(c in changes for c in PUBLIC_COLUMNS):
+            for user_id in updated:
+                self.changes.append("updated", user_id)
+        return updated
+
+    @invalidates_reads
+    async def delete_many(self, filters, ids, dry_run=False):
+        if dry_run:
+            return [u["id"] for u in self.store.find(filters.matches, ids)]
+        deleted = [u["id"] for u in self.store.delete_where(filters.matches, ids)]
+        for user_id in deleted:
+            self.changes.append("deleted", user_id)
+        return deleted
+
+
+# INSERT ... ON CONFLICT DO NOTHING des dialectes qui le supportent
+INSERT_IGNORING_CONFLICTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def filter_users(query, filters: UserFilters):
+    """Translate the list filters into WHERE clauses"""
+    if filters.role is not None:
+        query = query.filter(User.role == filters.role)
+    if filters.is_active is not None:
+        query = query.filter(User.is_active == filters.is_active)
+    if filters.created_after is not None:
+        query = query.filter(User.created_at >= filters.created_after)
+    if filters.created_before is not None:
+        query = query.filter(User.created_at < filters.created_before)
+    return query
+
+
+def select_users(query, filters: UserFilters, ids):
+    """filter_users plus an optional id list"""
+    query = filter_users(query, filters)
+    if ids is not None:
+        query = query.filter(User.id.in_(ids))
+    return query
+
+
+def page_users(query, page: Page):
+    """Keyset pagination on (created_at, id) or id, fetching one extra row"""
+    if page.sort_key == "created_at":
+        columns = (User.created_at, User.id)
+        after = page.after_created_at
+        if page.cursor and after is not None:
+            newer = User.created_at < after if page.descending else User.created_at > after
+            tie = User.id < page.after_id if page.descending else User.id > page.after_id
+            query = query.filter(or_(newer, and_(User.created_at == after, tie)))
+    else:
+        columns = (User.id,)
+        if page.cursor:
+            query = query.filter(User.id < page.after_id if page.descending else User.id > page.after_id)
+    order = [c.desc() if page.descending else c.asc() for c in columns]
+    return query.order_by(*order).limit(page.limit + 1)
+
+
+def search_users(query, page: Page):
+    """Ranked LIKE search on the lowercased fields, keyset-paginated on (rank, id)"""
+    username, email, first_name, last_name = fields = [
+        func.lower(User.username), func.lower(User.email), func.lower(User.first_name), func.lower(User.last_name)
+    ]
+    prefix = escape_like(query) + "%"
+    rank = case(
+        (or_(username == query, email == query), 0),
+        (username.like(prefix, escape="\\"), 1),
+        (email.like(prefix, escape="\\"), 2),
+        (or_(first_name.like(prefix, escape="\\"), last_name.like(prefix, escape="\\")), 3),
+        else_=4,
+    ).label("search_rank")
+    # Index trigrammes (init.sql): les LIKE '%...%' ne parcourent pas la table
+    contains = "%" + escape_like(query) + "%"
+    matches = select(User.__table__, rank).where(or_(*(f.like(contains, escape="\\") for f in fields))).subquery()
+    stmt = select(matches)
+    if page.cursor:
+        after_rank, after_id = page.cursor["rank"], page.after_id
+        stmt = stmt.where(or_(matches.c.search_rank > after_rank,
+                              and_(matches.c.search_rank == after_rank, matches.c.id > after_id)))
+    return stmt.order_by(matches.c.search_rank, matches.c.id).limit(page.limit + 1)
+
+
+def insert_users_one_by_one(db, rows, report):
+    """Fallback when a batch hits a concurrent unique violation"""
+    for index, user in rows:
+        savepoint = db.begin_nested()
+        try:
+            user_id = db.execute(insert(User).returning(User.id), user).scalar_one()
+            savepoint.commit()
+            report.created(index, user_id, user["username"])
+        except IntegrityError:
+            savepoint.rollback()
+            report.failed(index, "Username or email already exists", user["username"])
+    db.commit()
+
+
+def insert_users(db, prepared, report):
+    """One duplicate lookup and one multi-row INSERT per batch"""
+    for batch in batches(prepared):
+        usernames = [user["username"] for _, user in batch]
+        emails = [user["email"] for _, user in batch]
+        taken = db.execute(
+            select(User.username, User.email).where(or_(User.username.in_(usernames), User.email.in_(emails)))
+        ).all()
+        taken_usernames = {row.username for row in taken}
+        taken_emails = {row.email for row in taken}
+
+        to_insert = []
+        for index, user in batch:
+            if user["username"] in taken_usernames or user["email"] in taken_emails:
+                report.failed(index, "Username or email already exists", user["username"])
+            else:
+                to_insert.append((index, user))
+        if not to_insert:
+            continue
+
+        try:
+            # executemany avec RETURNING: SQLAlchemy regroupe en INSERT multi-lignes
+            result = db.execute(insert(User).returning(User.id, User.username), [user for _, user in to_insert])
+            ids = {row.username: row.id for row in result}
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            insert_users_one_by_one(db, to_insert, report)
+            continue
+        for index, user in to_insert:
+            report.created(index, ids[user["username"]], user["username"])
+
+
+class SqlBackend(UserBackend):
+    """Users table through SQLAlchemy, with a sync or an async session factory"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.engine = session_factory.kw["bind"]
+        self.pool_capacity = None
+        if session_factory.class_ is not AsyncSession:
+            pool = self.engine.pool
+            if isinstance(pool, QueuePool) and pool._max_overflow >= 0:
+                self.pool_capacity = pool.size() + pool._max_overflow
+        self._slots = weakref.WeakKeyDictionary()  # boucle -> Semaphore
+
+    def _pool_slot(self):
+        """Wait on the event loop for a free connection before a sync session takes a thread"""
+        if self.pool_capacity is None:
+            return nullcontext()
+        # Session sync: chaque appel passe par le threadpool et la connexion reste prise entre deux.
+        # Sans cette attente, les threads bloqués dans le checkout empêchent les sessions ouvertes de
+        # rendre leur connexion: interblocage jusqu'au pool_timeout.
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.pool_capacity)
+        return slots
+
+    @asynccontextmanager
+    async def session(self):
+        async with self._pool_slot():
+            db = self.session_factory()
+            try:
+                yield db
+            finally:
+                await close(db)
+
+    async def _one(self, statement):
+        async with self.session() as db:
+            row = (await execute(db, statement)).mappings().first()
+        return dict(row) if row is not None else None
+
+    async def count(self):
+        async with self.session() as db:
+            return (await execute(db, select(func.count(User.id)))).scalar_one()
+
+    async def get(self, user_id):
+        return await self._one(select(User.__table__).where(User.id == user_id))
+
+    async def get_by_username(self, username):
+        return await self._one(select(User.__table__).where(User.username == username))
+
+    async def list_users(self, filters, page):
+        stmt = page_users(filter_users(select(User.__table__), filters), page)
+        async with self.session() as db:
+            rows = (await execute(db, stmt)).mappings().all()
+        return paginate([dict(row) for row in rows], page)
+
+    async def search(self, query, page):
+        async with self.session() as db:
+            rows = (await execute(db, search_users(query, page))).mappings().all()
+        ranked = []
+        for row in rows:
+            user = dict(row)
+            ranked.append((user.pop("search_rank"), user))
+        return paginate_search(ranked, page.limit)
+
+    async def stats(self, recent):
+        """Aggregates computed by the database instead of shipping the table"""
+        async with self.session() as db:
+            counts = (await execute(db, select(User.role, User.is_active, func.count(User.id))
+                                    .group_by(User.role, User.is_active))).all()
+            # Index (created_at, id): ORDER BY ... LIMIT sans tri de la table
+            recent_users = (await execute(db, select(User.__table__)
+                                          .order_by(User.created_at.desc(), User.id.desc())
+                                          .limit(recent))).mappings().all()
+        roles = {}
+        active = 0
+        for role, is_active, count in counts:
+            roles[role] = roles.get(role, 0) + count
+            if is_active:
+                active += count
+        total = sum(roles.values())
+        return {"total": total, "active": active, "inactive": total - active, "roles": roles,
+                "recent": [dict(row) for row in recent_users]}
+
+    def export_rows(self, filters):
+        """Stream the users through a server-side cursor, without ORM objects"""
+        stmt = filter_users(select(*[getattr(User, c) for c in EXPORT_COLUMNS]), filters).order_by(User.id)
+        stmt = stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+        engine = self.engine
+
+        async def async_rows():
+            async with engine.connect() as conn:
+                result = await conn.stream(stmt)
+                async for row in result:
+                    yield row._mapping
+
+        def rows():
+            with engine.connect() as conn:
+                for row in conn.execute(stmt):
+                    yield row._mapping
+
+        return async_rows() if self.session_factory.class_ is AsyncSession else rows()
+
+    async def _write(self, statement):
+        """Run one write statement with RETURNING and commit: a single round trip"""
+        async with self.session() as db:
+            try:
+                row = (await execute(db, statement)).mappings().first()
+                await commit(db)
+            except IntegrityError:
+                # Violation d'unicité hors ON CONFLICT (UPDATE, autres dialectes)
+                raise DuplicateUserError("Username or email already exists")
+        return dict(row) if row is not None else None
+
+    @invalidates_reads
+    async def create(self, user):
+        insert_stmt = INSERT_IGNORING_CONFLICTS.get(self.engine.dialect.name, insert)
+        stmt = insert_stmt(User.__table__).values(**user)
+        if insert_stmt is not insert:
+            # ON CONFLICT DO NOTHING couvre username et email: aucune ligne = doublon
+            stmt = stmt.on_conflict_do_nothing()
+        created = await self._write(stmt.returning(*User.__table__.columns))
+        if created is None:
+            raise DuplicateUserError("Username or email already exists")
+        return created
+
+    @invalidates_reads
+    async def import_users(self, prepared, report):
+        async with self.session() as db:
+            await run_sync(db, insert_users, prepared, report)
+
+    @invalidates_reads
+    async def update(self, user_id, changes):
+        if not changes:
+            return await self.get(user_id)
+        return await self._write(update(User.__table__).where(User.id == user_id).values(**changes)
+                                 .returning(*User.__table__.columns))
+
+    @invalidates_reads
+    async def delete(self, user_id):
+        return await self._write(sql_delete(User.__table__).where(User.id == user_id)
+                                 .returning(*User.__table__.columns))
+
+    async def changes_since(self, since, limit):
+        """Rows of user_changes written by the triggers, with the current user"""
+        bounds = select(func.min(UserChange.version), func.max(UserChange.version))
+        stmt = (select(UserChange.version, UserChange.type, UserChange.user_id,
+                       *[getattr(User, f) for f in USER_FIELDS])
+                .outerjoin(User, User.id == UserChange.user_id)
+                .where(UserChange.version > since).order_by(UserChange.version).limit(limit))
+        async with self.session() as db:
+            oldest, latest = (await execute(db, bounds)).one()
+            rows = (await execute(db, stmt)).mappings().all() if limit else []
+        return [change_event(row["version"], row["type"], row["user_id"], row if row["id"] is not None else None)
+                for row in rows], oldest, latest or 0
+
+    async def _ids(self, statement, dry_run):
+        async with self.session() as db:
+            ids = (await execute(db, statement)).scalars().all()
+            if not dry_run:
+                await commit(db)
+        return sorted(ids)
+
+    @invalidates_reads
+    async def update_many(self, filters, ids, changes, dry_run=False):
+        if dry_run:
+            return await self._ids(select_users(select(User.id), filters, ids), dry_run)
+        # Un seul UPDATE ... WHERE ... RETURNING id; updated_at via onupdate de la colonne
+        stmt = select_users(update(User.__table__), filters, ids).values(**changes).returning(User.id)
+        return await self._ids(stmt, dry_run)
+
+    @invalidates_reads
+    async def delete_many(self, filters, ids, dry_run=False):
+        if dry_run:
+            return await self._ids(select_users(select(User.id), filters, ids), dry_run)
+        stmt = select_users(sql_delete(User.__table__), filters, ids).returning(User.id)
+        return await self._ids(stmt, dry_run)
+
+
+def init_sqlite_schema(url):
+    """Create the users table and the admin account if missing (no init.sql on SQLite)"""
+    from sqlalchemy import create_engine
+
+    engine = create_engine(url)
+    try:
+        for attempt in range(2):
+            try:
+                Base.metadata.create_all(bind=engine)
+                break
+            except OperationalError:
+                # Un autre worker a créé la table entre la vérification et le CREATE
+                if attempt:
+                    raise
+        with engine.begin() as conn:
+            conn.execute(sqlite_insert(User).values(**ADMIN_USER).on_conflict_do_nothing())
+    finally:
+        engine.dispose()
+
+
+def make_backend(name=STORAGE_BACKEND):
+    if name == "memory":
+        return MemoryBackend(UserStore([ADMIN_USER]))
+    if name == "sqlite":
+        init_sqlite_schema(SQLITE_URL)
+        backend = SqlBackend(database.sqlite_sessionmaker(SQLITE_URL))
+    elif name == "postgresql":
+        backend = SqlBackend(database.AsyncSessionLocal if database.DB_ASYNC else database.SessionLocal)
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND {name!r}, expected memory, sqlite or postgresql")
+    # Le store mémoire est déjà un dict: le cache ne sert que devant une base
+    return CachedBackend(backend) if USER_CACHE_SIZE else backend
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """FastAPI dependency returning the configured backend, created on first use"""
+    global _backend
+    if _backend is None:
+        # Dépendance sync, lancée dans le threadpool: un seul backend (et un seul pool) par worker
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend()
+    return _backend
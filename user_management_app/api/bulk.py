@@ -0,0 +1,155 @@
+"""Bulk user import, update and delete shared by the storage backends.
+
+The import payload is either a JSON array of users or a CSV file uploaded as
+the "file" field of a multipart form. Every row is validated on its own and
+the endpoint answers with a per-row report instead of failing the whole import.
+
+Bulk update and delete select users with an id list and/or the list filters
+and run as one set-based statement; dry_run only reports what would change.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, Field, ValidationError
+
+from hashing import password_hasher
+from pagination import user_filters
+
+MAX_BULK_ROWS = int(os.getenv("MAX_BULK_ROWS", "50000"))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# Une liste d'ids devient un IN (...): borne pour rester sous les limites de paramètres
+MAX_BULK_IDS = int(os.getenv("MAX_BULK_IDS", "10000"))
+
+
+class UserImport(BaseModel):
+    username: str
+    email: str
+    password: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    role: str = "user"
+
+
+async def read_bulk_rows(request: Request):
+    """FastAPI dependency reading the raw rows from JSON or an uploaded CSV"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing CSV file")
+        text = (await upload.read()).decode("utf-8-sig")
+        # Champs vides du CSV = valeurs absentes
+        rows = [{k: v for k, v in row.items() if v not in ("", None)} for row in csv.DictReader(io.StringIO(text))]
+    else:
+        try:
+            rows = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of users")
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} users per import")
+    return rows
+
+
+class BulkReport:
+    """Per-row outcome of an import, in input order"""
+
+    def __init__(self, size):
+        self.results = [None] * size
+
+    def created(self, row, user_id, username):
+        self.results[row] = {"row": row, "status": "created", "id": user_id, "username": username}
+
+    def failed(self, row, error, username=None):
+        self.results[row] = {"row": row, "status": "error", "username": username, "error": error}
+
+    def to_dict(self):
+        created = sum(1 for r in self.results if r["status"] == "created")
+        return {"created": created, "failed": len(self.results) - created, "results": self.results}
+
+
+def prepare_users(rows, report):
+    """Validate rows, drop duplicates inside the payload and hash passwords.
+
+    Returns (row index, user dict) pairs ready to insert; rejected rows are
+    recorded in the report.
+    """
+    valid = []
+    seen_usernames, seen_emails = set(), set()
+    for index, row in enumerate(rows):
+        try:
+            user = UserImport.model_validate(row)
+        except ValidationError as e:
+            username = row.get("username") if isinstance(row, dict) else None
+            report.failed(index, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()), username)
+            continue
+        if user.username in seen_usernames or user.email in seen_emails:
+            report.failed(index, "Duplicate username or email in payload", user.username)
+            continue
+        seen_usernames.add(user.username)
+        seen_emails.add(user.email)
+        valid.append((index, user))
+
+    hashes = password_hasher.hash_many([user.password for _, user in valid])
+    return [
+        (index, {
+            "username": user.username,
+            "email": user.email,
+            "password_hash": password_hash,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "role": user.role,
+            "is_active": True,
+        })
+        for (index, user), password_hash in zip(valid, hashes)
+    ]
+
+
+def batches(items, size=None):
+    size = size or BULK_BATCH_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class UserSelection(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=MAX_BULK_IDS)
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+    def to_filters(self):
+        """UserFilters of the selection; refuses to select the whole table by accident"""
+        filters = user_filters(self.role, self.is_active, self.created_after, self.created_before)
+        if self.ids is None and filters == user_filters():
+            raise HTTPException(status_code=400, detail="Select users with ids or at least one filter")
+        return filters
+
+
+class BulkChanges(BaseModel):
+    # Pas de username/email: uniques, ils n'ont pas de sens en masse
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+
+    def to_dict(self):
+        changes = self.model_dump(exclude_none=True)
+        if not changes:
+            raise HTTPException(status_code=400, detail="Nothing to update")
+        return changes
+
+
+class BulkUpdateRequest(BaseModel):
+    filter: UserSelection
+    changes: BulkChanges
+    dry_run: bool = False
+
+
+class BulkDeleteRequest(BaseModel):
+    filter: UserSelection
+    dry_run: bool = False
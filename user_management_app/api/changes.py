@@ -0,0 +1,261 @@
+"""Change feed of the users table for GET /users/changes and /users/changes/stream.
+
+Every create, update and delete appends an event with a monotonically
+increasing version to a change log:
+
+- SQL backends: the user_changes table, written by triggers on users (init.sql
+  for PostgreSQL, models.py for SQLite), so every worker sees every write and a
+  write still costs one statement from the app
+- memory: a ChangeLog ring buffer next to the UserStore, per worker like the users
+
+Both keep the last CHANGE_LOG_SIZE events. An event is
+{"version", "type": created|updated|deleted, "id", "user"}, the user being read
+with the event (public fields), None once deleted.
+
+/users/changes?since=<version> returns the events after a version, for clients
+that poll. A version older than the log, or newer than it after a restart of
+the memory backend, gets 410: reload the users and start again from the
+returned version.
+
+/users/changes/stream sends the same events as server-sent events, resumed
+from ?since= or Last-Event-ID. One ChangeFeed per worker polls the log every
+CHANGE_POLL_INTERVAL and fans the events out to one queue of
+CHANGE_FEED_BUFFER events per subscriber: a subscriber that falls that far
+behind gets a `reset` event and is disconnected instead of holding the others.
+
+On PostgreSQL a version is allocated at INSERT and visible at COMMIT, so a
+transaction may commit after a later version was read. The feed re-reads the
+last CHANGE_REORDER_WINDOW versions at every poll and publishes those it had
+not seen yet; /users/changes clients can pass a since a little behind their
+last version for the same effect.
+"""
+import asyncio
+import logging
+import os
+import weakref
+from collections import deque
+from itertools import islice
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+
+from models import CHANGE_LOG_SIZE
+from responses import project
+
+CHANGE_POLL_INTERVAL = float(os.getenv("CHANGE_POLL_INTERVAL", "0.5"))
+CHANGE_FEED_BUFFER = int(os.getenv("CHANGE_FEED_BUFFER", "256"))
+CHANGE_HEARTBEAT = float(os.getenv("CHANGE_HEARTBEAT", "15"))
+CHANGE_REORDER_WINDOW = int(os.getenv("CHANGE_REORDER_WINDOW", "32"))
+MAX_CHANGE_SUBSCRIBERS = int(os.getenv("MAX_CHANGE_SUBSCRIBERS", "1000"))
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+
+CHANGE_SUBSCRIBERS = Gauge('user_change_subscribers', 'Open change streams', multiprocess_mode='livesum')
+CHANGE_SUBSCRIBERS_DROPPED = Counter('user_change_subscribers_dropped_total', 'Change streams closed', ['reason'])
+CHANGE_EVENTS_PUBLISHED = Counter('user_change_events_published_total', 'Change events fanned out by the feeds')
+
+logger = logging.getLogger(__name__)
+
+# Sentinelle mise dans la file d'un abonné en retard
+RESET = object()
+
+
+class ChangesExpiredError(LookupError):
+    """Raised when a version is no longer (or not yet) covered by the change log"""
+
+
+def check_since(since, oldest, latest):
+    """Raise ChangesExpiredError unless the events after `since` are all in the log"""
+    if since > latest or (oldest is not None and since < oldest - 1):
+        raise ChangesExpiredError(f"Version {since} is outside the change log ({oldest}..{latest})")
+
+
+def change_event(version, change_type, user_id, user):
+    return {"version": version, "type": change_type, "id": user_id,
+            "user": project(user) if user is not None and change_type != "deleted" else None}
+
+
+class ChangeLog:
+    """Versioned ring buffer of (version, type, user id) for the memory backend"""
+
+    def __init__(self, size=CHANGE_LOG_SIZE):
+        self._events = deque(maxlen=size)
+        self.version = 0
+
+    def append(self, change_type, user_id):
+        # Appelé sous la boucle asyncio, sans await entre lecture et écriture
+        self.version += 1
+        self._events.append((self.version, change_type, user_id))
+
+    def since(self, since, limit):
+        """Return (events after since, oldest version, latest version)"""
+        oldest = self._events[0][0] if self._events else None
+        # Versions contiguës: les événements après since sont les derniers de la deque
+        newer = max(0, min(self.version - since, len(self._events)))
+        events = list(islice(reversed(self._events), newer))
+        events.reverse()
+        return events[:limit], oldest, self.version
+
+
+class Subscriber:
+    def __init__(self, size=CHANGE_FEED_BUFFER):
+        self.queue = asyncio.Queue(maxsize=size)
+
+    def put(self, event):
+        """Queue an event; False when the buffer is full"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def reset(self):
+        """Drop the queued events and leave only RESET"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESET)
+
+
+class ChangeFeed:
+    """Polls one backend's change log and fans the events out to the subscribers"""
+
+    def __init__(self, backend, interval=CHANGE_POLL_INTERVAL, buffer=CHANGE_FEED_BUFFER,
+                 window=CHANGE_REORDER_WINDOW, max_subscribers=MAX_CHANGE_SUBSCRIBERS):
+        self.backend = backend
+        self.interval = interval
+        self.buffer = buffer
+        self.window = window
+        self.max_subscribers = max_subscribers
+        self.version = None
+        self._floor = None  # position de départ: rien en dessous n'est republié
+        self.subscribers = set()
+        self._recent = deque(maxlen=max(window, 1) * 4)  # versions déjà publiées
+        self._task = None
+
+    def check_capacity(self):
+        """Raise 503 once max_subscribers streams are open on this worker"""
+        if len(self.subscribers) >= self.max_subscribers:
+            CHANGE_SUBSCRIBERS_DROPPED.labels(reason="full").inc()
+            raise HTTPException(status_code=503, detail="Too many change streams", headers={"Retry-After": "5"})
+
+    async def subscribe(self):
+        """Register a subscriber; the feed position is set before it returns"""
+        if self.version is None:
+            _, _, self.version = await self.backend.changes_since(0, 0)
+            self._floor = self.version
+        subscriber = Subscriber(self.buffer)
+        self.subscribers.add(subscriber)
+        CHANGE_SUBSCRIBERS.inc()
+        loop = asyncio.get_running_loop()
+        # Une tâche par boucle: celle d'une boucle fermée (tests) ne reprendra pas
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.discard(subscriber)
+            CHANGE_SUBSCRIBERS.dec()
+
+    def publish(self, event):
+        CHANGE_EVENTS_PUBLISHED.inc()
+        for subscriber in list(self.subscribers):
+            if not subscriber.put(event):
+                # File pleine: l'abonné repart d'un rechargement complet
+                subscriber.reset()
+                self.unsubscribe(subscriber)
+                CHANGE_SUBSCRIBERS_DROPPED.labels(reason="lagging").inc()
+
+    def reset_all(self):
+        for subscriber in list(self.subscribers):
+            subscriber.reset()
+            self.unsubscribe(subscriber)
+            CHANGE_SUBSCRIBERS_DROPPED.labels(reason="expired").inc()
+
+    async def poll(self):
+        """Read and publish the new events once; True when a full batch was read"""
+        since = max(self.version - self.window, 0)
+        events, oldest, latest = await self.backend.changes_since(since, DEFAULT_CHANGES_LIMIT)
+        try:
+            check_since(self.version, oldest, latest)
+        except ChangesExpiredError:
+            # Journal purgé ou remis à zéro sous nos pieds
+            logger.warning("Change feed lost its position at version %s", self.version)
+            self.version = self._floor = latest
+            self._recent.clear()
+            self.reset_all()
+            return False
+        for event in events:
+            if event["version"] <= self._floor or event["version"] in self._recent:
+                continue
+            self._recent.append(event["version"])
+            self.version = max(self.version, event["version"])
+            self.publish(event)
+        return len(events) >= DEFAULT_CHANGES_LIMIT
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                if await self.poll():
+                    continue
+            except Exception:
+                logger.exception("Change feed poll failed")
+            await asyncio.sleep(self.interval)
+
+
+_feeds = weakref.WeakKeyDictionary()
+
+
+def change_feed(backend):
+    """The ChangeFeed of a backend, created on first use"""
+    feed = _feeds.get(backend)
+    if feed is None:
+        feed = _feeds[backend] = ChangeFeed(backend)
+    return feed
+
+
+def sse_event(event):
+    data = orjson.dumps(event).decode()
+    return f"id: {event['version']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def event_stream(backend, since: Optional[int], heartbeat=CHANGE_HEARTBEAT):
+    """Server-sent events after `since` (the feed position when None), then live"""
+    feed = change_feed(backend)
+    # Abonnement avant le rattrapage: aucun événement ne tombe entre les deux
+    subscriber = await feed.subscribe()
+    try:
+        sent = set()
+        if since is None:
+            yield f"retry: 3000\nid: {feed.version}\n\n"
+        else:
+            while True:
+                events, oldest, latest = await backend.changes_since(since, DEFAULT_CHANGES_LIMIT)
+                try:
+                    check_since(since, oldest, latest)
+                except ChangesExpiredError:
+                    yield f"event: reset\ndata: {orjson.dumps({'version': latest}).decode()}\n\n"
+                    return
+                for event in events:
+                    sent.add(event["version"])
+                    yield sse_event(event)
+                if len(events) < DEFAULT_CHANGES_LIMIT:
+                    break
+                since = events[-1]["version"]
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Commentaire SSE: garde la connexion ouverte derrière les proxies
+                yield ": keepalive\n\n"
+                continue
+            if event is RESET:
+                yield "event: reset\ndata: {}\n\n"
+                return
+            if event["version"] not in sent:
+                yield sse_event(event)
+    finally:
+        feed.unsubscribe(subscriber)
+
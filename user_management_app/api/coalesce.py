@@ -0,0 +1,80 @@
+"""Single-flight coalescing of identical concurrent reads.
+
+When the same read (route and query string) arrives while an identical one is
+already running, it waits for that call instead of starting its own: one
+storage call and one serialised body are shared by every request of the
+burst. Nothing is kept once the call returns, so there is no staleness window:
+a request that arrives after the call finished starts a new one.
+
+Writes never go through it. The backend write methods are decorated with
+invalidates_reads, so a read that starts after a write returned never joins
+a call that began before it.
+
+Coalescing ratio: sum(rate(read_coalesce_requests_total{role="follower"}))
+divided by sum(rate(read_coalesce_requests_total)).
+"""
+import asyncio
+import functools
+import os
+
+from prometheus_client import Counter, Gauge
+
+COALESCE_READS = os.getenv("COALESCE_READS", "true").lower() == "true"
+
+COALESCE_REQUESTS = Counter('read_coalesce_requests_total', 'Reads through the single-flight layer',
+                            ['route', 'role'])
+COALESCE_IN_FLIGHT = Gauge('read_coalesce_in_flight', 'Distinct coalesced reads running', multiprocess_mode='livesum')
+
+
+class SingleFlight:
+    def __init__(self, enabled=COALESCE_READS):
+        self.enabled = enabled
+        self._calls = {}
+
+    async def do(self, route, key, loader):
+        """Result of loader(), shared with the identical calls already in flight"""
+        if not self.enabled:
+            return await loader()
+        call = self._calls.get((route, key))
+        if call is None:
+            COALESCE_REQUESTS.labels(route=route, role="leader").inc()
+            call = asyncio.ensure_future(loader())
+            self._calls[(route, key)] = call
+            COALESCE_IN_FLIGHT.inc()
+            call.add_done_callback(lambda done: self._forget((route, key), done))
+        else:
+            COALESCE_REQUESTS.labels(route=route, role="follower").inc()
+        # shield: un client qui abandonne n'annule pas l'appel des autres
+        return await asyncio.shield(call)
+
+    def _forget(self, key, call):
+        COALESCE_IN_FLIGHT.dec()
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Marque l'exception comme lue même si plus personne n'attend
+            call.exception()
+
+    def invalidate(self):
+        """Start fresh calls for the reads that arrive from now on"""
+        self._calls.clear()
+
+
+single_flight = SingleFlight()
+
+
+def invalidates_reads(method):
+    """Decorator for the backend write methods, see the module docstring"""
+    @functools.wraps(method)
+    async def write(self, *args, **kwargs):
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            # Aussi en cas d'erreur: un import par lots peut avoir écrit une partie des lignes
+            single_flight.invalidate()
+    return write
+
+
+def request_key(request):
+    """Path and query string: everything a coalesced read route depends on"""
+    return request.url.path, tuple(sorted(request.query_params.multi_items()))
@@ -0,0 +1,32 @@
+"""Strong ETags and If-None-Match handling for the user resources"""
+import hashlib
+
+from fastapi import Response
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts):
+    """Strong validator derived from versions / updated_at values"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    """If-None-Match uses the weak comparison (RFC 9110 13.1.2)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (c.strip() for c in header.split(","))
+    return etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response, etag):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
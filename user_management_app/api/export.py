@@ -0,0 +1,80 @@
+"""Streaming NDJSON/CSV serialisation for the user export endpoints.
+
+Rows are consumed lazily from an iterator (store scan or server-side cursor,
+sync or async) and written out in small chunks, so memory does not grow with
+the table.
+"""
+import csv
+import io
+import json
+
+from fastapi.responses import StreamingResponse
+
+EXPORT_COLUMNS = ("id", "username", "email", "first_name", "last_name", "role", "is_active", "created_at")
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _record(row):
+    """Project a store dict or a SQL row mapping on the exported columns"""
+    record = {c: row.get(c) for c in EXPORT_COLUMNS}
+    if record["created_at"] is not None:
+        record["created_at"] = record["created_at"].isoformat()
+    return record
+
+
+class _Encoder:
+    """Accumulates encoded rows and hands them out in chunks"""
+
+    def __init__(self, format):
+        self.format = format
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer) if format == "csv" else None
+        self.pending = 0
+        if self.writer:
+            self.writer.writerow(EXPORT_COLUMNS)
+
+    def add(self, row):
+        record = _record(row)
+        if self.writer:
+            self.writer.writerow(record[c] for c in EXPORT_COLUMNS)
+        else:
+            self.buffer.write(json.dumps(record))
+            self.buffer.write("\n")
+        self.pending += 1
+        return self.pending >= EXPORT_BATCH_SIZE
+
+    def flush(self):
+        chunk = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.pending = 0
+        return chunk
+
+
+def iter_chunks(rows, format):
+    encoder = _Encoder(format)
+    for row in rows:
+        if encoder.add(row):
+            yield encoder.flush()
+    yield encoder.flush()
+
+
+async def aiter_chunks(rows, format):
+    encoder = _Encoder(format)
+    async for row in rows:
+        if encoder.add(row):
+            yield encoder.flush()
+    yield encoder.flush()
+
+
+def export_response(rows, format):
+    body = aiter_chunks(rows, format) if hasattr(rows, "__aiter__") else iter_chunks(rows, format)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
@@ -0,0 +1,28 @@
+"""Gunicorn hooks for multi-process Prometheus metrics (used by serve.py).
+
+The master empties PROMETHEUS_MULTIPROC_DIR before forking so samples from a
+previous run are not merged into this one, and drops the live gauge files of
+each worker that exits. Counters and histograms of dead workers are kept so
+totals never go backwards.
+"""
+import os
+
+from prometheus_client import multiprocess
+
+
+def clear_multiproc_dir(path):
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+
+
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        clear_multiproc_dir(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
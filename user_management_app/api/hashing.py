@@ -0,0 +1,130 @@
+"""Password hashing service.
+
+Hashing and verification run in a bounded thread pool (pbkdf2 releases the
+GIL inside hashlib) so a slow KDF never runs on the event loop and the CPU
+spent on logins is capped. Jobs that wait in the queue longer than
+HASH_QUEUE_TIMEOUT, or arrive while HASH_MAX_QUEUE jobs are already pending,
+are rejected with HashingBusyError, which the API answers with 503.
+
+Legacy unsalted SHA-256 hex hashes are still accepted and flagged as
+deprecated, so verify_and_update returns a new hash to store on login.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge, Histogram
+
+HASH_SCHEME = os.getenv("HASH_SCHEME", "pbkdf2_sha256")
+HASH_ROUNDS = int(os.getenv("HASH_ROUNDS", "29000"))
+HASH_CONCURRENCY = int(os.getenv("HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "256"))
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "2"))
+
+HASH_DURATION = Histogram('password_hash_duration_seconds', 'Time spent hashing or verifying a password', ['operation'])
+HASH_QUEUE_WAIT = Histogram('password_hash_queue_wait_seconds', 'Time a hashing job waited for a worker')
+HASH_QUEUE_DEPTH = Gauge('password_hash_queue_depth', 'Hashing jobs submitted and not finished',
+                         multiprocess_mode='livesum')
+HASH_REJECTED = Counter('password_hash_rejected_total', 'Hashing jobs rejected', ['reason'])
+HASH_REHASHED = Counter('password_rehash_total', 'Stored hashes upgraded after a successful login')
+
+
+class HashingBusyError(RuntimeError):
+    """Raised when the hashing pool cannot take the job in time"""
+
+
+def make_context(scheme=HASH_SCHEME, rounds=HASH_ROUNDS):
+    return CryptContext(
+        schemes=[scheme, "hex_sha256"],
+        deprecated=["hex_sha256"],
+        **{f"{scheme}__default_rounds": rounds} if scheme != "hex_sha256" else {},
+    )
+
+
+class PasswordHasher:
+    def __init__(self, context=None, concurrency=HASH_CONCURRENCY, max_queue=HASH_MAX_QUEUE,
+                 queue_timeout=HASH_QUEUE_TIMEOUT):
+        self.context = context or make_context()
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="password-hash")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _submit(self, operation, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                HASH_REJECTED.labels(reason="queue_full").inc()
+                raise HashingBusyError("Password hashing queue is full")
+            self._pending += 1
+            HASH_QUEUE_DEPTH.set(self._pending)
+        enqueued = time.perf_counter()
+
+        def job():
+            try:
+                waited = time.perf_counter() - enqueued
+                HASH_QUEUE_WAIT.observe(waited)
+                if waited > self.queue_timeout:
+                    # Le client a probablement abandonné: inutile de brûler du CPU
+                    HASH_REJECTED.labels(reason="queue_timeout").inc()
+                    raise HashingBusyError("Timed out waiting for a hashing worker")
+                with HASH_DURATION.labels(operation=operation).time():
+                    return fn(*args)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    HASH_QUEUE_DEPTH.set(self._pending)
+
+        return self._pool.submit(job)
+
+    # API synchrone, pour les routes def (déjà dans le threadpool)
+    def hash(self, password):
+        return self._submit("hash", self.context.hash, password).result()
+
+    def verify_and_update(self, password, password_hash):
+        """Return (valid, new_hash); new_hash is set when the stored hash is outdated"""
+        return self._submit("verify", self._verify_and_update, password, password_hash).result()
+
+    def hash_many(self, passwords):
+        """Hash a batch keeping at most `concurrency` jobs in flight, so logins are not starved"""
+        results = [None] * len(passwords)
+        window = {}
+        for index, password in enumerate(passwords):
+            if len(window) >= self.concurrency:
+                oldest = next(iter(window))
+                results[oldest] = window.pop(oldest).result()
+            window[index] = self._pool.submit(self._timed_hash, password)
+        for index, future in window.items():
+            results[index] = future.result()
+        return results
+
+    # API asynchrone, pour les routes async def
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self._submit("hash", self.context.hash, password))
+
+    async def verify_and_update_async(self, password, password_hash):
+        return await asyncio.wrap_future(self._submit("verify", self._verify_and_update, password, password_hash))
+
+    def _timed_hash(self, password):
+        with HASH_DURATION.labels(operation="hash").time():
+            return self.context.hash(password)
+
+    def _verify_and_update(self, password, password_hash):
+        try:
+            valid, new_hash = self.context.verify_and_update(password, password_hash)
+        except ValueError:
+            # Hash stocké illisible: traité comme un mot de passe invalide
+            return False, None
+        if valid and new_hash:
+            HASH_REHASHED.inc()
+        return valid, new_hash
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,77 @@
+"""Label helpers for the HTTP metrics middleware.
+
+Requests are labelled with the route template they matched ("/users/{user_id}")
+instead of the raw path, so ids do not create one time series each. Paths that
+match no route share a single label, and the number of distinct endpoint
+labels is capped: past METRICS_MAX_ENDPOINTS new templates go to an overflow
+label instead of growing the scrape forever.
+
+With PROMETHEUS_MULTIPROC_DIR set (see serve.py), every worker writes its
+samples to that directory and /metrics aggregates all of them, so a scrape
+sees the whole server and not only the worker that answered.
+"""
+import os
+import threading
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_MAX_ENDPOINTS = int(os.getenv("METRICS_MAX_ENDPOINTS", "200"))
+# Bornes en secondes, séparées par des virgules
+REQUEST_DURATION_BUCKETS = tuple(
+    float(b) for b in os.getenv("METRICS_DURATION_BUCKETS", "").split(",") if b.strip()
+) or Histogram.DEFAULT_BUCKETS
+
+UNMATCHED_ENDPOINT = "__unmatched__"
+OVERFLOW_ENDPOINT = "__overflow__"
+KNOWN_METHODS = frozenset(["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+
+METRICS_LABEL_OVERFLOW = Counter('http_metrics_label_overflow_total',
+                                 'Requests recorded under the overflow endpoint label')
+
+
+def route_template(request):
+    """Path template of the route that handled the request, if any"""
+    route = request.scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None)
+
+
+def method_label(method):
+    # La méthode vient du client: on ne garde que les valeurs connues
+    return method if method in KNOWN_METHODS else "OTHER"
+
+
+class EndpointLabels:
+    """Bounded set of endpoint label values"""
+
+    def __init__(self, max_labels=METRICS_MAX_ENDPOINTS):
+        self.max_labels = max_labels
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        template = route_template(request)
+        if template is None:
+            return UNMATCHED_ENDPOINT
+        # Lecture sans verrou pour le cas courant: le label est déjà connu
+        if template in self._seen:
+            return template
+        with self._lock:
+            if template in self._seen or len(self._seen) < self.max_labels:
+                self._seen.add(template)
+                return template
+        METRICS_LABEL_OVERFLOW.inc()
+        return OVERFLOW_ENDPOINT
+
+
+endpoint_label = EndpointLabels()
+
+
+def collect_metrics():
+    """Exposition text for /metrics, merged across workers in multi-process mode"""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest()
+    # Registre neuf à chaque scrape, comme le recommande prometheus_client
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
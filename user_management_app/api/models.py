@@ -1,6 +1,11 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
-from sqlalchemy.sql import func
+import os
+
+from sqlalchemy import BigInteger, Column, DDL, Integer, String, Boolean, DateTime, event, text
 from database import Base
+from utils import utcnow
+
+# Événements gardés dans user_changes (même valeur que le trigger de init.sql)
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", "100000"))
 
 class User(Base):
     __tablename__ = "users"
@@ -13,5 +18,35 @@ class User(Base):
     last_name = Column(String(50))
     role = Column(String(20), default="user")
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
\ No newline at end of file
+    # UTC naïf côté Python, comme les DEFAULT de init.sql (curseur de pagination cohérent)
+    created_at = Column(DateTime, default=utcnow, index=True)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+class UserChange(Base):
+    """Change log of the users table, appended by database triggers (see changes.py)"""
+    __tablename__ = "user_changes"
+    # AUTOINCREMENT: SQLite ne réutilise jamais une version, même après une purge
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    version = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    type = Column(String(10), nullable=False)
+    changed_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"))
+
+# Triggers SQLite; ceux de PostgreSQL sont dans init.sql. Seuls les champs publics
+# comptent: un rehash du mot de passe au login n'est pas un changement.
+PUBLIC_COLUMNS = ("username", "email", "first_name", "last_name", "role", "is_active")
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS users_created AFTER INSERT ON users BEGIN "
+    "INSERT INTO user_changes (user_id, type) VALUES (NEW.id, 'created'); END",
+    "CREATE TRIGGER IF NOT EXISTS users_updated AFTER UPDATE ON users WHEN "
+    + " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in PUBLIC_COLUMNS)
+    + " BEGIN INSERT INTO user_changes (user_id, type) VALUES (NEW.id, 'updated'); END",
+    "CREATE TRIGGER IF NOT EXISTS users_deleted AFTER DELETE ON users BEGIN "
+    "INSERT INTO user_changes (user_id, type) VALUES (OLD.id, 'deleted'); END",
+    "CREATE TRIGGER IF NOT EXISTS user_changes_pruned AFTER INSERT ON user_changes BEGIN "
+    f"DELETE FROM user_changes WHERE version <= NEW.version - {CHANGE_LOG_SIZE}; END",
+]
+for trigger in SQLITE_TRIGGERS:
+    # Sur la metadata: les deux tables existent quand les triggers sont créés
+    event.listen(Base.metadata, "after_create", DDL(trigger).execute_if(dialect="sqlite"))
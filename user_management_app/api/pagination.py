@@ -0,0 +1,138 @@
+"""Keyset pagination and filters shared by the user list endpoints.
+
+The list endpoints return a plain JSON array like before; when more rows are
+available the opaque cursor of the next page is sent in the X-Next-Cursor
+header and must be passed back as ?cursor=.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@dataclass
+class UserFilters:
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+    def matches(self, user):
+        """Apply the filters to an in-memory user dict"""
+        if self.role is not None and user.get("role") != self.role:
+            return False
+        if self.is_active is not None and user.get("is_active", True) != self.is_active:
+            return False
+        created_at = user.get("created_at")
+        if self.created_after is not None and (created_at is None or created_at < self.created_after):
+            return False
+        if self.created_before is not None and (created_at is None or created_at >= self.created_before):
+            return False
+        return True
+
+
+@dataclass
+class Page:
+    limit: int = DEFAULT_PAGE_SIZE
+    order: str = "id"
+    cursor: Optional[dict] = None
+
+    @property
+    def descending(self):
+        return self.order.startswith("-")
+
+    @property
+    def sort_key(self):
+        return self.order.lstrip("-")
+
+    @property
+    def after_id(self):
+        return self.cursor["id"] if self.cursor else None
+
+    @property
+    def after_created_at(self):
+        if not self.cursor or self.cursor.get("created_at") is None:
+            return None
+        return datetime.fromisoformat(self.cursor["created_at"])
+
+
+def encode_cursor(user):
+    """Build the cursor pointing just after the given user (dict or ORM row)"""
+    if isinstance(user, dict):
+        user_id, created_at = user["id"], user.get("created_at")
+    else:
+        user_id, created_at = user.id, user.created_at
+    return encode_payload({"id": user_id, "created_at": created_at.isoformat() if created_at else None})
+
+
+def encode_payload(payload):
+    """Opaque, URL-safe token for a cursor payload"""
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload.get("id"), int):
+            raise ValueError("cursor without id")
+        if payload.get("created_at") is not None:
+            datetime.fromisoformat(payload["created_at"])
+        return payload
+    except (binascii.Error, ValueError, AttributeError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def user_filters(
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+):
+    """FastAPI dependency parsing the list filters from the query string"""
+    return UserFilters(
+        role=role,
+        is_active=is_active,
+        created_after=_naive_utc(created_after),
+        created_before=_naive_utc(created_before),
+    )
+
+
+def page_params(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: str = Query("id", pattern="^-?(id|created_at)$"),
+):
+    """FastAPI dependency parsing limit, cursor and order"""
+    page = Page(limit=limit, order=order, cursor=decode_cursor(cursor) if cursor else None)
+    if page.cursor and page.sort_key == "created_at" and page.after_created_at is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return page
+
+
+def paginate(rows, page):
+    """Take one page from an ordered iterable of rows.
+
+    Returns the rows and the cursor of the next page (None on the last page).
+    """
+    items = list(islice(rows, page.limit + 1))
+    if len(items) > page.limit:
+        items = items[:page.limit]
+        return items, encode_cursor(items[-1])
+    return items, None
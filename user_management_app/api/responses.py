@@ -0,0 +1,77 @@
+"""Fast JSON responses for user records.
+
+The read routes return a FastJSONResponse built straight from the backend
+dicts: the public fields are picked with one dict comprehension per user and
+orjson serialises the result, so FastAPI neither re-validates the records
+against the response model nor goes through the stdlib json encoder. The
+response_model stays on the routes for the OpenAPI schema.
+
+?fields=id,username limits each user to the listed fields.
+"""
+from typing import Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+
+# Champs de UserResponse: password_hash et updated_at ne sortent jamais
+USER_FIELDS = ("id", "username", "email", "first_name", "last_name", "role", "is_active", "created_at")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (datetimes as ISO 8601, like Pydantic)"""
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+
+def user_fields(
+    fields: Optional[str] = Query(None, description="Comma-separated user fields to return, e.g. id,username"),
+) -> Tuple[str, ...]:
+    """FastAPI dependency parsing ?fields= into a tuple of known user fields"""
+    if not fields:
+        return USER_FIELDS
+    selected = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in selected if f not in USER_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; "
+                                                    f"expected some of {', '.join(USER_FIELDS)}")
+    return selected
+
+
+def project(user, fields=USER_FIELDS):
+    # .get(): les champs optionnels peuvent manquer dans un dict du store mémoire
+    return {f: user.get(f) for f in fields}
+
+
+def users_response(users, fields=USER_FIELDS, headers=None):
+    return FastJSONResponse([{f: u.get(f) for f in fields} for u in users], headers=headers)
+
+
+def user_body(user, fields=USER_FIELDS):
+    return orjson.dumps(project(user, fields))
+
+
+def users_body(users, fields=USER_FIELDS):
+    return orjson.dumps([{f: u.get(f) for f in fields} for u in users])
+
+
+class LazyBody:
+    """Body serialised on first use, then reused: coalesced requests answered 304
+    never pay for it, those answered 200 share one serialisation"""
+
+    def __init__(self, render, *args):
+        self._render = render
+        self._args = args
+        self._body = None
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = self._render(*self._args)
+        return self._body
+
+
+def body_response(body, headers=None):
+    """Response for a body already serialised: one Response object per request"""
+    return Response(body, media_type="application/json", headers=headers)
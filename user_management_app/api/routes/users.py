@@ -1,11 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
-from models import User
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Tuple
+import logging
+from backends import UserBackend, get_backend
+from pagination import NEXT_CURSOR_HEADER, Page, UserFilters, page_params, user_filters
+from export import export_response
+from changes import (DEFAULT_CHANGES_LIMIT, MAX_CHANGES_LIMIT, ChangesExpiredError, change_feed,
+                     check_since, event_stream)
+from bulk import BulkDeleteRequest, BulkReport, BulkUpdateRequest, prepare_users, read_bulk_rows
+from coalesce import request_key, single_flight
+from etag import etag_matches, make_etag, not_modified, set_etag
+from hashing import password_hasher
+from responses import (FastJSONResponse, LazyBody, body_response, user_body, user_fields, users_body,
+                       users_response)
+from search import search_page, search_query
+from tokens import require_admin, token_service
+from store import DuplicateUserError
 from pydantic import BaseModel
 from datetime import datetime
-import hashlib
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -29,91 +44,207 @@ class UserResponse(BaseModel):
     id: int
     username: str
     email: str
-    first_name: str = None
-    last_name: str = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
     role: str
     is_active: bool
-    created_at: datetime
+    created_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
-def get_password_hash(password):
-    """Simple hash function for demo purposes"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(plain_password, hashed_password):
-    """Verify password for demo purposes"""
-    return get_password_hash(plain_password) == hashed_password
+class UserStats(BaseModel):
+    total: int
+    active: int
+    inactive: int
+    roles: Dict[str, int]
+    recent: List[UserResponse]
 
 @router.get("/", response_model=List[UserResponse])
-def get_users(db: Session = Depends(get_db)):
-    return db.query(User).all()
+async def get_users(
+    request: Request,
+    filters: UserFilters = Depends(user_filters),
+    page: Page = Depends(page_params),
+    fields: Tuple[str, ...] = Depends(user_fields),
+    backend: UserBackend = Depends(get_backend),
+):
+    logger.info("Get users endpoint called", extra={"event": "users.list"})
+    version = backend.collection_version()
+    if version is not None:
+        # La version de la collection suffit: pas de scan ni de sérialisation si rien n'a changé
+        etag = make_etag("users", version, sorted(request.query_params.multi_items()))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+    async def load():
+        users, next_cursor = await backend.list_users(filters, page)
+        # ETag de la page: ids et updated_at des lignes, la validation Pydantic est évitée sur 304
+        page_etag = etag if version is not None else make_etag(
+            [(u["id"], u["updated_at"]) for u in users], next_cursor, fields)
+        # Lignes du backend sérialisées telles quelles, et seulement pour un 200
+        return page_etag, LazyBody(users_body, users, fields), next_cursor
+
+    # Requêtes identiques simultanées: une lecture et une sérialisation partagées
+    etag, body, next_cursor = await single_flight.do("users.list", request_key(request), load)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response = body_response(body.body, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+    set_etag(response, etag)
+    return response
+
+@router.get("/stats", response_model=UserStats)
+async def get_user_stats(recent: int = Query(5, ge=0, le=50), backend: UserBackend = Depends(get_backend)):
+    logger.info("User stats endpoint called", extra={"event": "users.stats"})
+    return await single_flight.do("users.stats", recent, lambda: backend.stats(recent))
+
+@router.get("/export")
+async def export_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    filters: UserFilters = Depends(user_filters),
+    backend: UserBackend = Depends(get_backend),
+):
+    logger.info("Export users endpoint called", extra={"event": "users.export"})
+    return export_response(backend.export_rows(filters), format)
+
+@router.get("/search", response_model=List[UserResponse])
+async def search_users(
+    query: str = Depends(search_query),
+    page: Page = Depends(search_page),
+    fields: Tuple[str, ...] = Depends(user_fields),
+    backend: UserBackend = Depends(get_backend),
+):
+    """Users matching ?q= on username, email or names, best matches first"""
+    users, next_cursor = await backend.search(query, page)
+    return users_response(users, fields, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+@router.get("/changes")
+async def get_user_changes(
+    since: Optional[int] = Query(None, ge=0, description="Last version seen; omitted, returns the current version"),
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_CHANGES_LIMIT),
+    backend: UserBackend = Depends(get_backend),
+):
+    """Create, update and delete events after ?since=, oldest first"""
+    if since is None:
+        _, _, latest = await backend.changes_since(0, 0)
+        return {"version": latest, "changes": [], "has_more": False}
+    events, oldest, latest = await backend.changes_since(since, limit)
+    try:
+        check_since(since, oldest, latest)
+    except ChangesExpiredError:
+        raise HTTPException(status_code=410, detail="Version outside the change log, reload the users")
+    has_more = len(events) == limit and events[-1]["version"] < latest
+    version = events[-1]["version"] if has_more else latest
+    return FastJSONResponse({"version": version, "changes": events, "has_more": has_more})
+
+@router.get("/changes/stream")
+async def stream_user_changes(
+    since: Optional[int] = Query(None, ge=0, description="Last version seen; defaults to Last-Event-ID"),
+    last_event_id: Optional[str] = Header(None),
+    backend: UserBackend = Depends(get_backend),
+):
+    """Server-sent events for every create, update and delete; `reset` asks the client to reload"""
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    change_feed(backend).check_capacity()
+    return StreamingResponse(event_stream(backend, since), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+async def get_user(
+    user_id: int,
+    request: Request,
+    fields: Tuple[str, ...] = Depends(user_fields),
+    backend: UserBackend = Depends(get_backend),
+):
+    async def load():
+        user = await backend.get(user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return make_etag(user["id"], user["updated_at"], fields), LazyBody(user_body, user, fields)
+
+    etag, body = await single_flight.do("users.get", request_key(request), load)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response = body_response(body.body)
+    set_etag(response, etag)
+    return response
 
 @router.post("/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    # Vérifier si l'utilisateur existe déjà
-    existing_user = db.query(User).filter(
-        (User.username == user.username) | (User.email == user.email)
-    ).first()
-    
-    if existing_user:
+async def create_user(user: UserCreate, backend: UserBackend = Depends(get_backend),
+                      admin: dict = Depends(require_admin)):
+    logger.info("Create user attempt: %s", user.username)
+    new_user = {
+        "username": user.username,
+        "email": user.email,
+        "password_hash": await password_hasher.hash_async(user.password),
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "role": user.role,
+        "is_active": True
+    }
+    try:
+        new_user = await backend.create(new_user)
+    except DuplicateUserError:
+        logger.warning("User already exists: %s", user.username)
         raise HTTPException(status_code=400, detail="Username or email already exists")
-    
-    # Créer un nouvel utilisateur
-    db_user = User(
-        username=user.username,
-        email=user.email,
-        password_hash=get_password_hash(user.password),
-        first_name=user.first_name,
-        last_name=user.last_name,
-        role=user.role
-    )
-    
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    return db_user
+    logger.info("User created successfully: %s", user.username)
+    return new_user
+
+@router.post("/bulk")
+async def import_users(rows: list = Depends(read_bulk_rows), backend: UserBackend = Depends(get_backend),
+                       admin: dict = Depends(require_admin)):
+    """Create users in batches, with a per-row report"""
+    logger.info("Bulk import of %d users", len(rows))
+    report = BulkReport(len(rows))
+    prepared = await run_in_threadpool(prepare_users, rows, report)
+    await backend.import_users(prepared, report)
+    return report.to_dict()
+
+@router.post("/bulk/update")
+async def update_users(request: BulkUpdateRequest, backend: UserBackend = Depends(get_backend),
+                       admin: dict = Depends(require_admin)):
+    """Apply the same changes to every selected user with one UPDATE ... RETURNING"""
+    filters, changes = request.filter.to_filters(), request.changes.to_dict()
+    logger.info("Bulk update of %s (dry_run=%s)", changes, request.dry_run)
+    ids = await backend.update_many(filters, request.filter.ids, changes, request.dry_run)
+    return {"dry_run": request.dry_run, "matched": len(ids), "updated": 0 if request.dry_run else len(ids), "ids": ids}
+
+@router.post("/bulk/delete")
+async def delete_users(request: BulkDeleteRequest, backend: UserBackend = Depends(get_backend),
+                       admin: dict = Depends(require_admin)):
+    """Delete every selected user with one DELETE ... RETURNING"""
+    filters = request.filter.to_filters()
+    logger.info("Bulk delete (dry_run=%s)", request.dry_run)
+    ids = await backend.delete_many(filters, request.filter.ids, request.dry_run)
+    if not request.dry_run:
+        for user_id in ids:
+            token_service.revoke_user(user_id)
+    return {"dry_run": request.dry_run, "matched": len(ids), "deleted": 0 if request.dry_run else len(ids), "ids": ids}
 
 @router.put("/{user_id}", response_model=UserResponse)
-def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if user.username:
-        db_user.username = user.username
-    if user.email:
-        db_user.email = user.email
-    if user.first_name:
-        db_user.first_name = user.first_name
-    if user.last_name:
-        db_user.last_name = user.last_name
-    if user.role:
-        db_user.role = user.role
+async def update_user(user_id: int, user: UserUpdate, backend: UserBackend = Depends(get_backend),
+                      admin: dict = Depends(require_admin)):
+    # Champs vides ignorés, comme avant; is_active peut valoir False
+    changes = {name: value for name, value in user.model_dump(exclude={"is_active"}).items() if value}
     if user.is_active is not None:
-        db_user.is_active = user.is_active
-    
-    db.commit()
-    db.refresh(db_user)
-    
-    return db_user
+        changes["is_active"] = user.is_active
+    try:
+        updated_user = await backend.update(user_id, changes)
+    except DuplicateUserError:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
+    if updated_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return updated_user
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+async def delete_user(user_id: int, backend: UserBackend = Depends(get_backend),
+                      admin: dict = Depends(require_admin)):
+    logger.info("Delete user attempt: %s", user_id)
+    deleted_user = await backend.delete(user_id)
+    if deleted_user is None:
+        logger.warning("User not found for deletion: %s", user_id)
         raise HTTPException(status_code=404, detail="User not found")
-    
-    db.delete(user)
-    db.commit()
-    
-    return {"message": "User deleted successfully"}
\ No newline at end of file
+    # Les jetons déjà émis pour ce compte ne doivent plus passer
+    token_service.revoke_user(user_id)
+    logger.info("User deleted: %s", deleted_user["username"])
+    return {"message": "User deleted successfully"}
@@ -0,0 +1,148 @@
+"""User search for GET /users/search.
+
+A query matches users whose username, email, first_name or last_name contains
+it, case-insensitively. Results are ranked, then ordered by id:
+
+0. exact username or email
+1. username prefix
+2. email prefix
+3. first or last name prefix
+4. substring anywhere (SQL backends only)
+
+The memory backend looks candidates up in a sorted prefix index maintained by
+UserStore, so it only returns ranks 0 to 3. On PostgreSQL the LIKE patterns
+are served by the pg_trgm GIN indexes of init.sql, which also cover infixes.
+
+Pages are keyset-paginated on (rank, id); the next cursor is sent in the
+X-Next-Cursor header like for the list endpoint.
+"""
+from bisect import bisect_left
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+from pagination import Page, decode_cursor, encode_payload
+
+SEARCH_FIELDS = ("username", "email", "first_name", "last_name")
+MIN_QUERY_LENGTH = 2
+MAX_QUERY_LENGTH = 100
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+SUBSTRING_RANK = 4
+
+
+def search_terms(user):
+    """Lowercased values of the searchable fields"""
+    terms = []
+    for field in SEARCH_FIELDS:
+        value = user.get(field)
+        if value:
+            term = value.lower()
+            # Réutilise la chaîne déjà en minuscules: une copie de moins par entrée d'index
+            terms.append(value if term == value else term)
+    return terms
+
+
+def search_rank(user, query):
+    """Rank of a user for a lowercased query, None when it does not match"""
+    username = (user.get("username") or "").lower()
+    email = (user.get("email") or "").lower()
+    if query == username or query == email:
+        return 0
+    if username.startswith(query):
+        return 1
+    if email.startswith(query):
+        return 2
+    names = [(user.get(f) or "").lower() for f in ("first_name", "last_name")]
+    if any(name.startswith(query) for name in names):
+        return 3
+    if any(query in term for term in (username, email, *names)):
+        return SUBSTRING_RANK
+    return None
+
+
+class PrefixIndex:
+    """Sorted (term, id) pairs answering prefix lookups with a bisect.
+
+    New pairs go to a small unsorted buffer, merged into the sorted list once
+    it outgrows an eighth of it, so inserts stay cheap; a lookup merges first
+    when the buffer holds more than MERGE_THRESHOLD pairs, so it never scans
+    more than that linearly. Pairs left behind by updates and deletes are
+    not removed: callers re-check the user, and merges drop the pairs that
+    is_live() rejects.
+    """
+
+    MERGE_THRESHOLD = 1024
+
+    def __init__(self, is_live):
+        self.is_live = is_live
+        self._entries = []
+        self._pending = []
+
+    def __len__(self):
+        return len(self._entries) + len(self._pending)
+
+    def add(self, user_id, terms):
+        self._pending.extend((term, user_id) for term in terms)
+        if len(self._pending) > max(self.MERGE_THRESHOLD, len(self._entries) // 8):
+            self.merge()
+
+    def merge(self):
+        # Nouvelle liste plutôt que tri en place: une recherche en cours garde l'ancienne
+        live = [entry for entry in self._entries if self.is_live(*entry)]
+        live.extend(entry for entry in self._pending if self.is_live(*entry))
+        live.sort()
+        self._entries, self._pending = live, []
+
+    def lookup(self, prefix):
+        """Ids having a term that starts with prefix (may include stale ones)"""
+        if len(self._pending) > self.MERGE_THRESHOLD:
+            self.merge()
+        entries = self._entries
+        ids = set()
+        pos = bisect_left(entries, (prefix,))
+        while pos < len(entries) and entries[pos][0].startswith(prefix):
+            ids.add(entries[pos][1])
+            pos += 1
+        ids.update(user_id for term, user_id in self._pending if term.startswith(prefix))
+        return ids
+
+
+def escape_like(value):
+    """Escape the LIKE wildcards of a user-supplied string (escape character \\)"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def encode_search_cursor(rank, user):
+    return encode_payload({"id": user["id"], "rank": rank})
+
+
+def paginate_search(ranked, limit):
+    """Page of users from (rank, user) pairs sorted by (rank, id), fetched with one extra"""
+    ranked = list(ranked)
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_search_cursor(*ranked[-1])
+    return [user for _, user in ranked], next_cursor
+
+
+def search_query(q: str = Query(..., min_length=MIN_QUERY_LENGTH, max_length=MAX_QUERY_LENGTH)):
+    """FastAPI dependency returning the normalised query"""
+    query = q.strip().lower()
+    if len(query) < MIN_QUERY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Query must have at least {MIN_QUERY_LENGTH} characters")
+    return query
+
+
+def search_page(
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """FastAPI dependency parsing limit and a (rank, id) cursor"""
+    if cursor is None:
+        return Page(limit=limit)
+    payload = decode_cursor(cursor)
+    if not isinstance(payload.get("rank"), int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return Page(limit=limit, cursor=payload)
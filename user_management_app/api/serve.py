@@ -0,0 +1,43 @@
+"""Run the API under gunicorn with N uvicorn workers and shared metrics.
+
+Usage: python serve.py [--workers N] [--bind HOST:PORT]
+
+PROMETHEUS_MULTIPROC_DIR is set before gunicorn starts so every worker
+records its metrics in the same directory and /metrics reports the whole
+server (see metrics.collect_metrics and gunicorn_conf.py).
+"""
+import argparse
+import os
+import tempfile
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), "user-management-metrics")
+
+
+def gunicorn_argv(workers, bind):
+    return [
+        "gunicorn",
+        "-c", os.path.join(API_DIR, "gunicorn_conf.py"),
+        "-w", str(workers),
+        "-k", "uvicorn.workers.UvicornWorker",
+        "--bind", bind,
+        "--chdir", API_DIR,
+        "app:app",
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--bind", default=os.getenv("BIND", "0.0.0.0:5000"))
+    args = parser.parse_args(argv)
+
+    # Doit précéder l'import de prometheus_client dans les workers
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", DEFAULT_METRICS_DIR)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    argv = gunicorn_argv(args.workers, args.bind)
+    os.execvp(argv[0], argv)
+
+
+if __name__ == "__main__":
+    main()
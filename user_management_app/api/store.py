@@ -0,0 +1,264 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+from search import PrefixIndex, search_terms
+from utils import utcnow
+
+
+class DuplicateUserError(ValueError):
+    """Raised when a username or email is already taken"""
+
+
+class UserStore:
+    """Thread-safe in-memory user store.
+
+    Users are kept in a dict keyed by id with secondary hash indexes on
+    username and email, so inserts, lookups and deletes are O(1) whatever
+    the number of accounts. Ids come from a monotonic counter and are never
+    reused, even after a delete.
+
+    Two sorted key lists, on id and on (created_at, id), back ordered scans
+    for keyset pagination. Inserts usually append; an out-of-order key
+    (explicit id or caller-supplied created_at) replaces the list with a
+    new copy so running scans keep a consistent snapshot. Deletes leave
+    tombstones which are compacted lazily.
+
+    A PrefixIndex on the lowercased username, email and names serves
+    search(); its stale entries are dropped when it merges.
+    """
+
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(self, users=None):
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_username = {}
+        self._by_email = {}
+        self._keys = {"id": [], "created_at": []}
+        self._tombstones = 0
+        self._search = PrefixIndex(self._is_search_term)
+        self._next_id = 1
+        self._active_count = 0
+        self._role_counts = {}
+        # Version de la collection, incrémentée à chaque écriture (ETag de GET /users/)
+        self._version = 0
+        for user in users or []:
+            self.add(user)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        # Itère sur une copie pour ne pas bloquer les écritures concurrentes
+        with self._lock:
+            users = list(self._by_id.values())
+        return iter(users)
+
+    def __contains__(self, user_id):
+        return user_id in self._by_id
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def active_count(self):
+        return self._active_count
+
+    def stats(self):
+        """Counters maintained on every write, no scan needed"""
+        with self._lock:
+            return {
+                "total": len(self._by_id),
+                "active": self._active_count,
+                "roles": dict(self._role_counts),
+            }
+
+    def get(self, user_id):
+        return self._by_id.get(user_id)
+
+    def get_by_username(self, username):
+        return self._by_username.get(username)
+
+    def get_by_email(self, email):
+        return self._by_email.get(email)
+
+    def add(self, user):
+        """Insert a user dict, allocating an id when it has none"""
+        with self._lock:
+            if user["username"] in self._by_username or user["email"] in self._by_email:
+                raise DuplicateUserError("Username or email already exists")
+
+            # Copie: le dict de l'appelant ne doit pas pouvoir désynchroniser les index
+            user = dict(user)
+            user_id = user.get("id")
+            if user_id is None:
+                user_id = self._next_id
+                user["id"] = user_id
+            elif user_id in self._by_id:
+                raise DuplicateUserError(f"User id {user_id} already exists")
+            if user.get("created_at") is None:
+                user["created_at"] = utcnow()
+            if user.get("updated_at") is None:
+                user["updated_at"] = user["created_at"]
+            self._next_id = max(self._next_id, user_id + 1)
+
+            self._by_id[user_id] = user
+            self._by_username[user["username"]] = user
+            self._by_email[user["email"]] = user
+            self._index(user)
+            self._search.add(user_id, search_terms(user))
+            if user.get("is_active", True):
+                self._active_count += 1
+            self._count_role(user.get("role", "user"), 1)
+            self._version += 1
+            return user
+
+    def update(self, user_id, changes):
+        """Apply field changes to a user and return the new record, or None.
+
+        The stored dict is replaced rather than mutated, so readers holding
+        the previous record keep a consistent snapshot.
+        """
+        changes = {k: v for k, v in changes.items() if k not in ("id", "created_at")}
+        with self._lock:
+            user = self._by_id.get(user_id)
+            if user is None:
+                return None
+            updated = {**user, **changes, "updated_at": utcnow()}
+            if updated["username"] != user["username"] and updated["username"] in self._by_username:
+                raise DuplicateUserError("Username or email already exists")
+            if updated["email"] != user["email"] and updated["email"] in self._by_email:
+                raise DuplicateUserError("Username or email already exists")
+
+            del self._by_username[user["username"]]
+            del self._by_email[user["email"]]
+            self._by_id[user_id] = updated
+            self._by_username[updated["username"]] = updated
+            self._by_email[updated["email"]] = updated
+            old_terms = search_terms(user)
+            self._search.add(user_id, [t for t in search_terms(updated) if t not in old_terms])
+            self._active_count += int(updated.get("is_active", True)) - int(user.get("is_active", True))
+            self._count_role(user.get("role", "user"), -1)
+            self._count_role(updated.get("role", "user"), 1)
+            self._version += 1
+            return updated
+
+    def add_many(self, users):
+        """Insert several users under a single lock acquisition.
+
+        Returns, in input order, the stored user or the DuplicateUserError
+        raised for that row.
+        """
+        results = []
+        with self._lock:
+            for user in users:
+                try:
+                    results.append(self.add(user))
+                except DuplicateUserError as e:
+                    results.append(e)
+        return results
+
+    def delete(self, user_id):
+        """Remove a user and return it, or None when the id is unknown"""
+        with self._lock:
+            user = self._by_id.pop(user_id, None)
+            if user is None:
+                return None
+            del self._by_username[user["username"]]
+            del self._by_email[user["email"]]
+            if user.get("is_active", True):
+                self._active_count -= 1
+            self._count_role(user.get("role", "user"), -1)
+            self._version += 1
+            self._tombstones += 1
+            if self._tombstones > self.COMPACT_THRESHOLD and self._tombstones > len(self._by_id):
+                # Nouvelles listes: les scans en cours gardent les anciennes
+                self._keys = {
+                    "id": [i for i in self._keys["id"] if i in self._by_id],
+                    "created_at": [k for k in self._keys["created_at"] if self._is_live("created_at", k)],
+                }
+                self._tombstones = 0
+            return user
+
+    def find(self, predicate, user_ids=None):
+        """Users matching predicate, among user_ids when given, in id order"""
+        with self._lock:
+            if user_ids is None:
+                users = self.scan()
+            else:
+                users = [self._by_id.get(i) for i in sorted(set(user_ids))]
+            return [u for u in users if u is not None and predicate(u)]
+
+    def update_where(self, predicate, changes, user_ids=None):
+        """Apply the same changes to every matching user at once; returns the new records"""
+        with self._lock:
+            return [self.update(u["id"], changes) for u in self.find(predicate, user_ids)]
+
+    def delete_where(self, predicate, user_ids=None):
+        """Remove every matching user at once; returns the removed records"""
+        with self._lock:
+            return [self.delete(u["id"]) for u in self.find(predicate, user_ids)]
+
+    def search(self, prefix):
+        """Users with a username, email, first or last name starting with a lowercased prefix"""
+        with self._lock:
+            users = (self._by_id.get(i) for i in self._search.lookup(prefix))
+            # L'index peut garder d'anciens termes: on revérifie sur l'utilisateur courant
+            return [u for u in users if u is not None and any(t.startswith(prefix) for t in search_terms(u))]
+
+    def scan(self, after=None, descending=False, order="id"):
+        """Yield users sorted by order ("id" or "created_at") after a key.
+
+        The key is an id for "id" and a (created_at, id) tuple for "created_at".
+        """
+        keys = self._keys[order]
+        if descending:
+            pos = len(keys) - 1 if after is None else bisect_left(keys, after) - 1
+            while pos >= 0:
+                user = self._is_live(order, keys[pos])
+                if user is not None:
+                    yield user
+                pos -= 1
+        else:
+            pos = 0 if after is None else bisect_right(keys, after)
+            while pos < len(keys):
+                user = self._is_live(order, keys[pos])
+                if user is not None:
+                    yield user
+                pos += 1
+
+    def _count_role(self, role, delta):
+        count = self._role_counts.get(role, 0) + delta
+        if count:
+            self._role_counts[role] = count
+        else:
+            self._role_counts.pop(role, None)
+
+    def _is_live(self, order, key):
+        """Return the user behind a key, or None for a tombstone"""
+        if order == "id":
+            return self._by_id.get(key)
+        user = self._by_id.get(key[1])
+        if user is None or user["created_at"] != key[0]:
+            return None
+        return user
+
+    def _is_search_term(self, term, user_id):
+        user = self._by_id.get(user_id)
+        return user is not None and term in search_terms(user)
+
+    def _index(self, user):
+        for order, key in (("id", user["id"]), ("created_at", (user["created_at"], user["id"]))):
+            keys = self._keys[order]
+            if not keys or key > keys[-1]:
+                keys.append(key)
+                continue
+            pos = bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                # Clé réinsérée: la pierre tombale redevient une entrée vivante
+                if order == "id":
+                    self._tombstones -= 1
+                continue
+            # Copie plutôt qu'insertion en place pour ne pas décaler un scan en cours
+            self._keys[order] = keys[:pos] + [key] + keys[pos:]
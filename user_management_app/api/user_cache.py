@@ -0,0 +1,158 @@
+"""Read-through cache for single-user lookups (GET /users/{id}, login).
+
+CachedBackend wraps a UserBackend and keeps recently read users in a
+size-bounded LRU with a TTL, indexed by id and by username. The API's own
+writes invalidate the entries they touch; writes made by other workers are
+only seen once the entry expires, so USER_CACHE_TTL bounds the staleness.
+
+Entries keep password_hash apart from the cached user: get() never returns
+it, only get_by_username() does, for the login check. Hit ratio in PromQL:
+rate(user_cache_hits_total[5m]) / (rate(user_cache_hits_total[5m]) + rate(user_cache_misses_total[5m])).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+USER_CACHE_HITS = Counter('user_cache_hits_total', 'Single-user lookups served from the cache', ['key'])
+USER_CACHE_MISSES = Counter('user_cache_misses_total', 'Single-user lookups that went to storage', ['key'])
+USER_CACHE_EVICTIONS = Counter('user_cache_evictions_total', 'Users dropped from the cache', ['reason'])
+USER_CACHE_ENTRIES = Gauge('user_cache_entries', 'Users currently cached', multiprocess_mode='livesum')
+
+
+class UserCache:
+    def __init__(self, max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # id -> (expires_at, user sans hash, password_hash)
+        self._ids_by_username = {}
+        self._lock = threading.Lock()
+        # Incrémenté à chaque invalidation: une lecture commencée avant n'est pas mise en cache
+        self.generation = 0
+
+    def _drop(self, user_id, reason):
+        """Lock held"""
+        _, user, _ = self._entries.pop(user_id)
+        if self._ids_by_username.get(user["username"]) == user_id:
+            del self._ids_by_username[user["username"]]
+        USER_CACHE_EVICTIONS.labels(reason=reason).inc()
+
+    def lookup(self, user_id=None, username=None):
+        """Return (user without password_hash, password_hash), or None"""
+        with self._lock:
+            if user_id is None:
+                user_id = self._ids_by_username.get(username)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user, password_hash = entry
+            if expires_at <= self.clock():
+                self._drop(user_id, "expired")
+                USER_CACHE_ENTRIES.set(len(self._entries))
+                return None
+            self._entries.move_to_end(user_id)
+            return user, password_hash
+
+    def store(self, user, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            if user["id"] in self._entries:
+                self._drop(user["id"], "replaced")
+            public = {k: v for k, v in user.items() if k != "password_hash"}
+            self._entries[user["id"]] = (self.clock() + self.ttl, public, user.get("password_hash"))
+            self._ids_by_username[user["username"]] = user["id"]
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)), "size")
+            USER_CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self.generation += 1
+            for user_id in user_ids:
+                if user_id in self._entries:
+                    self._drop(user_id, "invalidated")
+            USER_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._ids_by_username.clear()
+            USER_CACHE_ENTRIES.set(0)
+
+
+class CachedBackend:
+    """UserBackend decorator caching get() and get_by_username()"""
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache or UserCache()
+
+    def __getattr__(self, name):
+        # Listes, stats, export...: délégués tels quels au backend
+        return getattr(self.backend, name)
+
+    async def _load(self, key, loader, *args):
+        USER_CACHE_MISSES.labels(key=key).inc()
+        generation = self.cache.generation
+        user = await loader(*args)
+        if user is not None:
+            self.cache.store(user, generation)
+        return user
+
+    async def get(self, user_id):
+        cached = self.cache.lookup(user_id=user_id)
+        if cached is not None:
+            USER_CACHE_HITS.labels(key="id").inc()
+            return cached[0]
+        user = await self._load("id", self.backend.get, user_id)
+        return {k: v for k, v in user.items() if k != "password_hash"} if user is not None else None
+
+    async def get_by_username(self, username):
+        cached = self.cache.lookup(username=username)
+        if cached is not None:
+            USER_CACHE_HITS.labels(key="username").inc()
+            user, password_hash = cached
+            return {**user, "password_hash": password_hash}
+        return await self._load("username", self.backend.get_by_username, username)
+
+    async def create(self, user):
+        created = await self.backend.create(user)
+        self.cache.invalidate(created["id"])
+        return created
+
+    async def import_users(self, prepared, report):
+        await self.backend.import_users(prepared, report)
+        self.cache.invalidate()
+
+    async def update(self, user_id, changes):
+        try:
+            return await self.backend.update(user_id, changes)
+        finally:
+            # Aussi en cas d'échec: l'état stocké est alors inconnu
+            self.cache.invalidate(user_id)
+
+    async def delete(self, user_id):
+        try:
+            return await self.backend.delete(user_id)
+        finally:
+            self.cache.invalidate(user_id)
+
+    async def update_many(self, filters, ids, changes, dry_run=False):
+        updated = await self.backend.update_many(filters, ids, changes, dry_run)
+        if not dry_run:
+            self.cache.invalidate(*updated)
+        return updated
+
+    async def delete_many(self, filters, ids, dry_run=False):
+        deleted = await self.backend.delete_many(filters, ids, dry_run)
+        if not dry_run:
+            self.cache.invalidate(*deleted)
+        return deleted
@@ -0,0 +1,6 @@
+from datetime import datetime, timezone
+
+
+def utcnow():
+    """Naive UTC timestamp, same clock as the TIMESTAMP defaults in init.sql"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,257 @@
+"""Load and latency benchmark of the API, run in-process.
+
+Usage:
+    python benchmarks/bench_api.py [--backend memory|sqlite] [--sizes 1000 10000 ...]
+        [--requests N] [--concurrency N] [--scenarios get list ...]
+        [--output results.json] [--baseline benchmarks/baseline.json]
+        [--threshold 0.2] [--save-baseline]
+
+The FastAPI app is driven through httpx's ASGI transport (no sockets, no
+server) with the users seeded directly in the backend. Each scenario sends
+--requests requests from --concurrency concurrent clients and reports
+throughput and p50/p95/p99 latency. Results are printed as JSON and written
+to --output.
+
+With --baseline, every result is compared to the stored one and the run
+exits with status 1 when p95 grows or throughput drops by more than
+--threshold. Baselines are machine specific: record them with
+--save-baseline on the machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Coût du KDF réduit: on mesure l'API, pas pbkdf2 (cf. bench_login.py)
+os.environ.setdefault("HASH_ROUNDS", "1000")
+# Toutes les requêtes viennent de la même adresse: pas de limite de tentatives de login
+os.environ.setdefault("LOGIN_RATE_PER_USERNAME", "1000000/1")
+os.environ.setdefault("LOGIN_RATE_PER_IP", "1000000/1")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Clé JWT de développement: sans JWT_KEYS, tokens.py refuse de démarrer
+os.environ.setdefault("JWT_DEV_KEYS", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "api"))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+
+import app as api_app  # noqa: E402
+import database  # noqa: E402
+from backends import MemoryBackend, SqlBackend, get_backend  # noqa: E402
+from database import Base  # noqa: E402
+from hashing import password_hasher  # noqa: E402
+from models import User  # noqa: E402
+from store import UserStore  # noqa: E402
+from tokens import token_service  # noqa: E402
+from user_cache import USER_CACHE_SIZE, CachedBackend  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SCENARIOS = ["login", "list", "get", "search", "create", "update", "delete"]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+SEED_BATCH = 10_000
+PASSWORD = "password"
+
+
+def seed_rows(size, password_hash):
+    for i in range(size):
+        yield {
+            "username": f"user{i}",
+            "email": f"user{i}@example.com",
+            "password_hash": password_hash,
+            "first_name": "Bench",
+            "last_name": "User",
+            "role": "admin" if i % 100 == 0 else "user",
+            "is_active": i % 10 != 0,
+        }
+
+
+def memory_backend(size, password_hash):
+    store = UserStore()
+    store.add_many(seed_rows(size, password_hash))
+    return MemoryBackend(store)
+
+
+def sqlite_backend(size, password_hash, directory):
+    url = f"sqlite:///{os.path.join(directory, f'bench_{size}.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    rows = seed_rows(size, password_hash)
+    with engine.begin() as conn:
+        while batch := [row for _, row in zip(range(SEED_BATCH), rows)]:
+            conn.execute(insert(User), batch)
+    engine.dispose()
+    # Comme make_backend: le cache des lectures unitaires fait partie de ce qui est livré
+    backend = SqlBackend(database.sqlite_sessionmaker(url))
+    return CachedBackend(backend) if USER_CACHE_SIZE else backend
+
+
+class Scenario:
+    """Request factory for one scenario; ids created by `create` feed `delete`"""
+
+    def __init__(self, size):
+        self.size = size
+        self.random = random.Random(size)
+        self.created = []
+        self.counter = 0
+
+    def existing(self):
+        return self.random.randrange(1, self.size + 1)
+
+    def login(self):
+        return "POST", "/auth/login", {"json": {"username": f"user{self.existing() - 1}", "password": PASSWORD}}
+
+    def list(self):
+        return "GET", "/users/", {"params": {"limit": 50, "role": "user", "is_active": "true"}}
+
+    def get(self):
+        return "GET", f"/users/{self.existing()}", {}
+
+    def search(self):
+        # Préfixe d'un username existant: quelques correspondances, comme une saisie réelle
+        return "GET", "/users/search", {"params": {"q": f"user{self.existing() // 10}"}}
+
+    def create(self):
+        self.counter += 1
+        name = f"bench{self.counter}"
+        return "POST", "/users/", {"json": {"username": name, "email": f"{name}@example.com", "password": PASSWORD}}
+
+    def update(self):
+        return "PUT", f"/users/{self.existing()}", {"json": {"first_name": f"Bench{self.counter}"}}
+
+    def delete(self):
+        # Supprime les utilisateurs du scénario create: la taille du jeu ne bouge pas
+        user_id = self.created.pop() if self.created else 0
+        return "DELETE", f"/users/{user_id}", {}
+
+
+async def run_scenario(client, scenario, name, requests, concurrency):
+    make_request = getattr(scenario, name)
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, kwargs = make_request()
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+            elif name == "create":
+                scenario.created.append(response.json()["id"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+async def run_size(backend, size, scenarios, requests, concurrency):
+    api_app.app.dependency_overrides[get_backend] = lambda: backend
+    transport = httpx.ASGITransport(app=api_app.app)
+    scenario = Scenario(size)
+    results = {}
+    # create et delete exigent un jeton admin
+    headers = {"Authorization": f"Bearer {token_service.issue({'id': 1, 'role': 'admin'})['access_token']}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None,
+                                 headers=headers) as client:
+        # Échauffement: imports paresseux, pools, caches de routes
+        for _ in range(10):
+            method, path, kwargs = scenario.get()
+            await client.request(method, path, **kwargs)
+        for name in scenarios:
+            results[name] = await run_scenario(client, scenario, name, requests, concurrency)
+    api_app.app.dependency_overrides.pop(get_backend, None)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List the regressions of results against baseline, as readable strings"""
+    regressions = []
+    for key, base in baseline.get("results", {}).items():
+        current = results.get(key)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["rps"] < base["rps"] / (1 + threshold):
+            regressions.append(f"{key}: throughput {base['rps']} -> {current['rps']} req/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"write the results as the baseline (default {DEFAULT_BASELINE})")
+    args = parser.parse_args(argv)
+
+    for name in ("app", "routes.users", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    password_hash = password_hasher.hash(PASSWORD)
+    report = {
+        "meta": {
+            "backend": args.backend,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "hash_rounds": int(os.environ["HASH_ROUNDS"]),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            if args.backend == "memory":
+                backend = memory_backend(size, password_hash)
+            else:
+                backend = sqlite_backend(size, password_hash, directory)
+            results = asyncio.run(run_size(backend, size, args.scenarios, args.requests, args.concurrency))
+            for name, result in results.items():
+                report["results"][f"{args.backend}/{size}/{name}"] = result
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline or DEFAULT_BASELINE, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
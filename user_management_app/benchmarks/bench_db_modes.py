@@ -0,0 +1,98 @@
+"""Requests per second of the users router in sync and async database mode.
+
+Usage: DATABASE_URL=postgresql://... python benchmarks/bench_db_modes.py [clients...]
+
+The API is driven in-process through an ASGI transport by N concurrent
+clients doing GET /users/{id}, with a SqlBackend on a sync or async session
+factory. In sync mode every query goes through the
+threadpool, in async mode it runs on the event loop (asyncpg/aiosqlite).
+Defaults to a local SQLite file when DATABASE_URL is not set; numbers are
+only meaningful against PostgreSQL.
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+# On mesure le débit: pas de 503 de l'admission control à 1000 clients
+os.environ.setdefault("ADMISSION_LIMITS", "read=0:0:1,write=0:0:1,bulk=0:0:1,auth=0:0:1")
+# Clé JWT de développement: sans JWT_KEYS, tokens.py refuse de démarrer
+os.environ.setdefault("JWT_DEV_KEYS", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine, func, insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app as api_app  # noqa: E402
+from backends import SqlBackend, get_backend  # noqa: E402
+from database import Base, async_database_url  # noqa: E402
+from models import User  # noqa: E402
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///bench_users.db")
+DEFAULT_CLIENTS = [50, 200, 1000]
+DURATION = float(os.getenv("BENCH_DURATION", "5"))
+SEED_USERS = 10_000
+POOL_SIZE = 20
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        count = db.scalar(select(func.count(User.id)))
+        if count < SEED_USERS:
+            db.execute(insert(User), [
+                {"username": f"bench{i}", "email": f"bench{i}@example.com", "password_hash": "x", "role": "user"}
+                for i in range(count, SEED_USERS)
+            ])
+            db.commit()
+        return db.scalars(select(User.id)).all()
+
+
+def build_app(mode):
+    kwargs = {} if DATABASE_URL.startswith("sqlite") else {"pool_size": POOL_SIZE, "max_overflow": 0}
+    if mode == "sync":
+        Session = sessionmaker(bind=create_engine(DATABASE_URL, **kwargs), autoflush=False)
+    else:
+        Session = async_sessionmaker(create_async_engine(async_database_url(DATABASE_URL), **kwargs),
+                                     autoflush=False, expire_on_commit=False)
+    backend = SqlBackend(Session)
+    api_app.app.dependency_overrides[get_backend] = lambda: backend
+    return api_app.app
+
+
+async def run(app, ids, clients):
+    transport = httpx.ASGITransport(app=app)
+    done = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def worker(client):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            response = await client.get(f"/users/{random.choice(ids)}")
+            assert response.status_code == 200
+            done += 1
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(clients)))
+        return done / (time.perf_counter() - start)
+
+
+def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("routes.users").setLevel(logging.WARNING)
+    clients = [int(c) for c in sys.argv[1:]] or DEFAULT_CLIENTS
+    ids = seed(create_engine(DATABASE_URL))
+    print(f"{'clients':>8} {'sync req/s':>12} {'async req/s':>12}")
+    for n in clients:
+        sync_rps = asyncio.run(run(build_app("sync"), ids, n))
+        async_rps = asyncio.run(run(build_app("async"), ids, n))
+        print(f"{n:>8} {sync_rps:>12.0f} {async_rps:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Login throughput of the in-memory API under concurrency.
+
+Usage: python benchmarks/bench_login.py [clients...]
+
+Each client task calls the login endpoint in a loop for BENCH_DURATION seconds.
+Hashing runs in the bounded pool of hashing.py (HASH_CONCURRENCY workers,
+HASH_ROUNDS rounds), so throughput should plateau around HASH_CONCURRENCY
+cores and extra load shows up as queue waits and 503 rejections rather than
+as a blocked server.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+# On mesure le hachage: les seaux de tentatives par compte et par IP ne doivent pas refuser
+os.environ.setdefault("LOGIN_RATE_PER_USERNAME", "1000000/1")
+os.environ.setdefault("LOGIN_RATE_PER_IP", "1000000/1")
+# Clé JWT de développement: sans JWT_KEYS, tokens.py refuse de démarrer
+os.environ.setdefault("JWT_DEV_KEYS", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from fastapi import HTTPException, Request  # noqa: E402
+
+import app  # noqa: E402
+from backends import MemoryBackend  # noqa: E402
+from hashing import HASH_CONCURRENCY, HASH_ROUNDS, HashingBusyError, password_hasher  # noqa: E402
+from store import UserStore  # noqa: E402
+
+DEFAULT_CLIENTS = [1, 4, 16, 64]
+DURATION = float(os.getenv("BENCH_DURATION", "5"))
+USERS = 1_000
+
+
+def seed():
+    password_hash = password_hasher.hash("password")
+    return MemoryBackend(UserStore([
+        {"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": password_hash,
+         "first_name": None, "last_name": None, "role": "user", "is_active": True}
+        for i in range(USERS)
+    ]))
+
+
+async def run(backend, clients):
+    ok = rejected = 0
+    request = Request({"type": "http", "client": ("127.0.0.1", 0), "headers": []})
+    deadline = time.perf_counter() + DURATION
+
+    async def client(n):
+        nonlocal ok, rejected
+        i = n
+        while time.perf_counter() < deadline:
+            try:
+                await app.login(app.LoginRequest(username=f"user{i % USERS}", password="password"), request, backend)
+                ok += 1
+            except (HashingBusyError, HTTPException):
+                rejected += 1
+            i += clients
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - start
+    print(f"{clients:>8} {ok / elapsed:>12.1f} {rejected:>10}")
+
+
+def main():
+    logging.getLogger("app").setLevel(logging.WARNING)
+    backend = seed()
+    print(f"pool={HASH_CONCURRENCY} rounds={HASH_ROUNDS}")
+    print(f"{'clients':>8} {'logins/s':>12} {'rejected':>10}")
+    for clients in [int(c) for c in sys.argv[1:]] or DEFAULT_CLIENTS:
+        asyncio.run(run(backend, clients))
+
+
+if __name__ == "__main__":
+    main()
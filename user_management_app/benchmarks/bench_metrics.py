@@ -0,0 +1,80 @@
+"""Per-request overhead of the metrics middleware.
+
+Usage: python benchmarks/bench_metrics.py [requests]
+
+The same route is served by a bare FastAPI app and by one with the API's
+monitor_requests middleware, called directly as ASGI apps (no HTTP, no
+client) so the difference is the middleware cost: the call_next plumbing,
+route template lookup, label guard and the two metric updates.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Clé JWT de développement: sans JWT_KEYS, tokens.py refuse de démarrer
+os.environ.setdefault("JWT_DEV_KEYS", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from fastapi import FastAPI  # noqa: E402
+
+import app as api_app  # noqa: E402
+
+DEFAULT_REQUESTS = 20_000
+ROUNDS = 5
+
+
+def build_app(with_middleware):
+    app = FastAPI()
+
+    @app.get("/users/{user_id}")
+    async def get_user(user_id: int):
+        return {"id": user_id}
+
+    if with_middleware:
+        app.middleware("http")(api_app.monitor_requests)
+    return app
+
+
+async def call(app, user_id):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": f"/users/{user_id}", "raw_path": f"/users/{user_id}".encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app, requests):
+    await call(app, 0)  # construit la pile de middlewares
+    start = time.perf_counter()
+    for i in range(requests):
+        await call(app, i)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS
+    bare, monitored = build_app(False), build_app(True)
+    bare_us, monitored_us = [], []
+    for _ in range(ROUNDS):
+        bare_us.append(asyncio.run(measure(bare, requests)))
+        monitored_us.append(asyncio.run(measure(monitored, requests)))
+    bare_p50, monitored_p50 = statistics.median(bare_us), statistics.median(monitored_us)
+    print(f"{'app':>12} {'µs/request':>12}")
+    print(f"{'bare':>12} {bare_p50:>12.1f}")
+    print(f"{'monitored':>12} {monitored_p50:>12.1f}")
+    print(f"{'overhead':>12} {monitored_p50 - bare_p50:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Login and create latency of the in-memory API against the number of users.
+
+Usage: python benchmarks/bench_store.py [sizes...]
+
+The endpoints are called directly (no HTTP) so the numbers only reflect the
+cost of the user store lookups. Latency should stay flat from 1k to 1M users.
+The KDF work factor is lowered (HASH_ROUNDS) so hashing does not hide the
+store cost; see bench_login.py for the hashing side.
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("HASH_ROUNDS", "1000")
+# Tous les logins viennent de la même adresse: pas de limite de tentatives
+os.environ.setdefault("LOGIN_RATE_PER_USERNAME", "1000000/1")
+os.environ.setdefault("LOGIN_RATE_PER_IP", "1000000/1")
+# Clé JWT de développement: sans JWT_KEYS, tokens.py refuse de démarrer
+os.environ.setdefault("JWT_DEV_KEYS", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from fastapi import Request  # noqa: E402
+
+import app  # noqa: E402
+from backends import MemoryBackend  # noqa: E402
+from hashing import password_hasher  # noqa: E402
+from routes import users  # noqa: E402
+from store import UserStore  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SAMPLES = 1_000
+
+
+def seed(size):
+    password_hash = password_hasher.hash("password")
+    store = UserStore()
+    for i in range(size):
+        store.add({
+            "username": f"user{i}",
+            "email": f"user{i}@example.com",
+            "password_hash": password_hash,
+            "first_name": "Bench",
+            "last_name": "User",
+            "role": "user",
+            "is_active": True,
+        })
+    return MemoryBackend(store)
+
+
+async def measure(fn, samples):
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        await fn(i)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings) * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+async def run(size):
+    backend = seed(size)
+    request = Request({"type": "http", "client": ("127.0.0.1", 0), "headers": []})
+
+    async def login(i):
+        await app.login(app.LoginRequest(username=f"user{(i * 7919) % size}", password="password"), request, backend)
+
+    async def create(i):
+        await users.create_user(users.UserCreate(username=f"new{size}_{i}", email=f"new{size}_{i}@example.com",
+                                                 password="password"), backend)
+
+    login_p50, login_p99 = await measure(login, SAMPLES)
+    create_p50, create_p99 = await measure(create, SAMPLES)
+    print(f"{size:>10} {login_p50:>10.1f} {login_p99:>10.1f} {create_p50:>10.1f} {create_p99:>10.1f}")
+
+
+def main():
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("routes.users").setLevel(logging.WARNING)
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'users':>10} {'login p50':>10} {'login p99':>10} {'create p50':>10} {'create p99':>10}  (µs)")
+    for size in sizes:
+        asyncio.run(run(size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Cost of access token verification per request.
+
+Usage: python benchmarks/bench_tokens.py [--iterations N] [--requests N] [--revoked N]
+
+Reports, in microseconds:
+- verify: TokenService.verify on a valid access token (signature, claims, denylist)
+- verify_revoked_N: the same with N revoked tokens on the denylist
+- sqlite_lookup: reading the user by id from a SQLite file, i.e. what a
+  per-request session lookup would cost instead
+- request_with_auth / request_without_auth: p50 of two identical routes
+  through httpx's ASGI transport, one behind require_admin (requests
+  interleaved, after a warm-up); the difference is the overhead seen by a
+  request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+# Clé JWT de développement: sans JWT_KEYS, tokens.py refuse de démarrer
+os.environ.setdefault("JWT_DEV_KEYS", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+
+import database  # noqa: E402
+from backends import ADMIN_USER, SqlBackend, init_sqlite_schema  # noqa: E402
+from tokens import TokenService, require_admin, token_service  # noqa: E402
+
+
+def per_call_us(func, iterations):
+    return round(timeit.timeit(func, number=iterations) / iterations * 1e6, 2)
+
+
+def bench_verify(iterations, revoked):
+    service = TokenService()
+    token = service.issue(ADMIN_USER)["access_token"]
+    results = {"verify": per_call_us(lambda: service.verify(token), iterations)}
+    for i in range(revoked):
+        service.denylist.revoke(f"jti{i}", time.time() + 3600)
+    results[f"verify_revoked_{revoked}"] = per_call_us(lambda: service.verify(token), iterations)
+    return results
+
+
+def bench_lookup(iterations):
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'users.db')}"
+        init_sqlite_schema(url)
+        backend = SqlBackend(database.sqlite_sessionmaker(url))
+        loop = asyncio.new_event_loop()
+        try:
+            return per_call_us(lambda: loop.run_until_complete(backend.get(1)), iterations)
+        finally:
+            loop.close()
+            backend.engine.dispose()
+
+
+def probe_app():
+    """Two identical routes, one behind require_admin: no dependency_overrides,
+    which make FastAPI re-analyse the overridden dependencies on every request"""
+    probe = FastAPI()
+
+    @probe.get("/open")
+    async def open_route():
+        return {"ok": True}
+
+    @probe.get("/admin")
+    async def admin_route(claims: dict = Depends(require_admin)):
+        return {"ok": True}
+
+    return probe
+
+
+async def request_p50(requests, headers):
+    """Median latency of both routes, requests interleaved after a warm-up"""
+    transport = httpx.ASGITransport(app=probe_app())
+    latencies = {"request_with_auth": [], "request_without_auth": []}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(requests + 200):
+            with_auth = i % 2 == 0
+            start = time.perf_counter()
+            response = await client.get("/admin" if with_auth else "/open", headers=headers)
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+            if i >= 200:
+                latencies["request_with_auth" if with_auth else "request_without_auth"].append(elapsed)
+    return {name: round(statistics.median(values) * 1e6, 1) for name, values in latencies.items()}
+
+
+def bench_requests(requests):
+    headers = {"Authorization": f"Bearer {token_service.issue(ADMIN_USER)['access_token']}"}
+    results = asyncio.run(request_p50(requests, headers))
+    results["auth_overhead"] = round(results["request_with_auth"] - results["request_without_auth"], 1)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--revoked", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    report = {"unit": "microseconds"}
+    report.update(bench_verify(args.iterations, args.revoked))
+    report["sqlite_lookup"] = bench_lookup(args.iterations)
+    report.update(bench_requests(args.requests))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
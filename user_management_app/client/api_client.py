@@ -0,0 +1,124 @@
+"""Shared HTTP client used by the Flask views to call the user API.
+
+A single requests.Session is shared by every thread: its urllib3 connection
+pools are thread-safe and keep connections to the API alive between calls.
+The session stores no cookies (the API is stateless), which is the only part
+of Session that is not safe to share.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Histogram
+from urllib3.util.retry import Retry
+
+API_POOL_CONNECTIONS = int(os.getenv("API_POOL_CONNECTIONS", "4"))
+API_POOL_MAXSIZE = int(os.getenv("API_POOL_MAXSIZE", "20"))
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.2"))
+# Réponses GET conservées avec leur ETag pour les requêtes conditionnelles
+API_ETAG_ENTRIES = int(os.getenv("API_ETAG_ENTRIES", "256"))
+
+# (connect, read) en secondes, par endpoint logique
+DEFAULT_TIMEOUT = (3.05, 10)
+TIMEOUTS = {
+    "health": (1, 5),
+    "login": (3.05, 10),
+    "users.list": (3.05, 10),
+    "users.search": (3.05, 10),
+    "users.stats": (3.05, 10),
+    "users.changes": (1, 5),
+    "users.create": (3.05, 15),
+    "users.delete": (3.05, 10),
+}
+
+# Seules les méthodes sûres sont rejouées: un POST rejoué pourrait créer deux fois
+RETRY_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+API_CLIENT_DURATION = Histogram('api_client_request_duration_seconds', 'Duration of calls to the user API',
+                                ['endpoint', 'method', 'status'])
+API_CLIENT_ERRORS = Counter('api_client_errors_total', 'Calls to the user API that raised', ['endpoint', 'error'])
+API_CLIENT_NOT_MODIFIED = Counter('api_client_not_modified_total', 'Conditional GETs answered 304', ['endpoint'])
+
+
+class _NoCookies(requests.cookies.RequestsCookieJar):
+    def set_cookie(self, *args, **kwargs):
+        pass
+
+
+class ApiClient:
+    def __init__(self, base_url, pool_connections=API_POOL_CONNECTIONS, pool_maxsize=API_POOL_MAXSIZE,
+                 retries=API_RETRIES, backoff=API_RETRY_BACKOFF, timeouts=None, etag_entries=API_ETAG_ENTRIES):
+        self.base_url = base_url.rstrip("/")
+        self.etag_entries = etag_entries
+        self._etags = OrderedDict()
+        self._etags_lock = threading.Lock()
+        self.timeouts = {**TIMEOUTS, **(timeouts or {})}
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.cookies = _NoCookies()
+        self.session.headers["Connection"] = "keep-alive"
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, endpoint, **kwargs):
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, DEFAULT_TIMEOUT))
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.exceptions.RequestException as e:
+            API_CLIENT_ERRORS.labels(endpoint=endpoint, error=type(e).__name__).inc()
+            API_CLIENT_DURATION.labels(endpoint=endpoint, method=method, status="error").observe(time.perf_counter() - start)
+            raise
+        API_CLIENT_DURATION.labels(endpoint=endpoint, method=method, status=response.status_code).observe(
+            time.perf_counter() - start)
+        return response
+
+    def get(self, path, endpoint, **kwargs):
+        """GET with If-None-Match: a 304 hands back the stored 200 response"""
+        if not self.etag_entries:
+            return self.request("GET", path, endpoint, **kwargs)
+        key = (path, tuple(sorted((kwargs.get("params") or {}).items())))
+        with self._etags_lock:
+            cached = self._etags.get(key)
+        if cached is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "If-None-Match": cached.headers["ETag"]}
+
+        response = self.request("GET", path, endpoint, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            API_CLIENT_NOT_MODIFIED.labels(endpoint=endpoint).inc()
+            return cached
+        cacheable = response.status_code == 200 and "ETag" in response.headers
+        if cacheable:
+            response.content  # charge le corps pour pouvoir le resservir
+        with self._etags_lock:
+            if cacheable:
+                self._etags[key] = response
+                self._etags.move_to_end(key)
+                while len(self._etags) > self.etag_entries:
+                    self._etags.popitem(last=False)
+            else:
+                self._etags.pop(key, None)
+        return response
+
+    def post(self, path, endpoint, **kwargs):
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def delete(self, path, endpoint, **kwargs):
+        return self.request("DELETE", path, endpoint, **kwargs)
+
+    def close(self):
+        self.session.close()
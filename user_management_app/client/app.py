@@ -1,12 +1,15 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, flash
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 import requests
 import os
-import hashlib
 import logging
 from datetime import datetime
+from logs import setup_logging
+from api_client import ApiClient
+from cache import ResponseCache
 
-# Configurer le logging
-logging.basicConfig(level=logging.INFO)
+# Logs JSON écrits par un thread de fond (logs.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -15,11 +18,36 @@ app.secret_key = os.getenv("SECRET_KEY", "dev-secret-key")
 # Configuration de l'URL de l'API - CORRIGÉ POUR AWS/DOCKER
 IS_DOCKER = os.environ.get('DOCKER', 'false').lower() == 'true'
 API_BASE_URL = "http://api:5000" if IS_DOCKER else "http://localhost:5000"
-logger.info(f"API Base URL configured: {API_BASE_URL}")
-logger.info(f"Docker mode: {IS_DOCKER}")
+logger.info("API Base URL configured: %s", API_BASE_URL)
+logger.info("Docker mode: %s", IS_DOCKER)
 
-def get_password_hash(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+# Client HTTP partagé: connexions keep-alive réutilisées, retries sur les GET
+api = ApiClient(API_BASE_URL)
+# Cache des lectures, invalidé par les écritures faites depuis ce client
+api_cache = ResponseCache()
+
+# Pagination de l'API /users/ (curseur renvoyé dans l'en-tête X-Next-Cursor)
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "50"))
+# Borne haute de limit sur /users/search
+SEARCH_PAGE_SIZE = 100
+
+def fetch_users_page(params):
+    """Fetch one page of /users/ (or /users/search with q), returns (users, next_cursor)"""
+    path, resource = ("/users/search", "users.search") if params.get('q') else ("/users/", "users.list")
+    def load():
+        response = api.get(path, resource, params=params)
+        # Une page en erreur ne doit pas être mise en cache ni passer pour vide
+        response.raise_for_status()
+        return response.json(), response.headers.get('X-Next-Cursor')
+    return api_cache.get_or_load(resource, tuple(sorted(params.items())), load)
+
+def fetch_user_stats(recent=5):
+    """Aggregates computed by the API: one small request instead of the whole table"""
+    def load():
+        response = api.get("/users/stats", "users.stats", params={'recent': recent})
+        response.raise_for_status()
+        return response.json()
+    return api_cache.get_or_load('users.stats', recent, load)
 
 def is_admin():
     return 'user' in session and session['user'].get('role') == 'admin'
@@ -27,6 +55,25 @@ def is_admin():
 def is_authenticated():
     return 'user' in session
 
+TOKEN_FIELDS = ('access_token', 'refresh_token', 'token_type', 'expires_in')
+
+def store_tokens(tokens):
+    session['access_token'] = tokens.get('access_token')
+    session['refresh_token'] = tokens.get('refresh_token')
+
+def api_write(method, path, endpoint, **kwargs):
+    """Write call with the session's access token, refreshed once if the API answers 401"""
+    def send():
+        headers = {'Authorization': f"Bearer {session.get('access_token')}"}
+        return api.request(method, path, endpoint, headers=headers, **kwargs)
+    response = send()
+    if response.status_code == 401 and session.get('refresh_token'):
+        refreshed = api.post("/auth/refresh", "login", json={'refresh_token': session['refresh_token']})
+        if refreshed.status_code == 200:
+            store_tokens(refreshed.json())
+            response = send()
+    return response
+
 # Routes principales
 @app.route('/')
 def index():
@@ -45,22 +92,31 @@ def login():
         
         try:
             login_data = {"username": username, "password": password}
-            logger.info(f"Attempting login to: {API_BASE_URL}/auth/login")
-            response = requests.post(f"{API_BASE_URL}/auth/login", json=login_data, timeout=10)
+            logger.info("Attempting login to: %s/auth/login", API_BASE_URL, extra={"event": "login.attempt"})
+            # Adresse du navigateur: l'API limite les tentatives par IP (FORWARDED_ALLOW_IPS côté API)
+            response = api.post("/auth/login", "login", json=login_data,
+                                headers={'X-Forwarded-For': request.remote_addr} if request.remote_addr else None)
             
             if response.status_code == 200:
                 user_data = response.json()
+                # Jetons à part: session['user'] reste le profil affiché par les templates
+                store_tokens({k: user_data.pop(k, None) for k in TOKEN_FIELDS})
                 session['user'] = user_data
                 session['login_time'] = datetime.now().isoformat()
                 flash('Login successful!', 'success')
-                logger.info(f"Login successful for user: {username}")
+                logger.info("Login successful for user: %s", username, extra={"event": "login.success"})
                 return redirect(url_for('dashboard'))
+            elif response.status_code in (429, 503):
+                retry_after = response.headers.get('Retry-After', '1')
+                logger.warning("Login refused for user: %s, status: %s", username, response.status_code, extra={"event": "login.failed"})
+                reason = 'Too many login attempts' if response.status_code == 429 else 'Server busy'
+                flash(f'{reason}, please retry in {retry_after} seconds', 'error')
             else:
-                logger.warning(f"Login failed for user: {username}, status: {response.status_code}")
+                logger.warning("Login failed for user: %s, status: %s", username, response.status_code, extra={"event": "login.failed"})
                 flash('Invalid credentials', 'error')
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"API connection error: {e}")
+            logger.error("API connection error: %s", e)
             # Fallback pour l'admin en cas d'urgence
             if username == "admin" and password == "admin":
                 admin_user = {
@@ -84,6 +140,11 @@ def login():
 
 @app.route('/logout')
 def logout():
+    if session.get('access_token'):
+        try:
+            api_write("POST", "/auth/logout", "login", json={'refresh_token': session.get('refresh_token')})
+        except requests.exceptions.RequestException as e:
+            logger.warning("Logout API error: %s", e)
     session.clear()
     flash('You have been logged out successfully', 'info')
     return redirect(url_for('login'))
@@ -94,20 +155,18 @@ def dashboard():
         return redirect(url_for('login'))
     
     try:
-        logger.info(f"Fetching users from: {API_BASE_URL}/users/")
-        users_response = requests.get(f"{API_BASE_URL}/users/", timeout=10)
-        users = users_response.json() if users_response.status_code == 200 else []
+        logger.info("Fetching user stats from: %s/users/stats", API_BASE_URL, extra={"event": "dashboard"})
+        summary = fetch_user_stats(recent=5)
         
-        # Calcul des statistiques
         stats = {
-            'total_users': len(users),
-            'active_users': len([u for u in users if u.get('is_active', True)]),
-            'admin_users': len([u for u in users if u.get('role') == 'admin']),
-            'inactive_users': len([u for u in users if not u.get('is_active', True)]),
+            'total_users': summary['total'],
+            'active_users': summary['active'],
+            'admin_users': summary['roles'].get('admin', 0),
+            'inactive_users': summary['inactive'],
         }
         
         # Utilisateurs récents (5 derniers)
-        recent_users = sorted(users, key=lambda x: x.get('id', 0), reverse=True)[:5]
+        recent_users = summary['recent']
         
         return render_template('dashboard.html', 
                              user=session['user'], 
@@ -116,7 +175,7 @@ def dashboard():
                              login_time=session.get('login_time'))
     
     except requests.exceptions.RequestException as e:
-        logger.error(f"Dashboard API error: {e}")
+        logger.error("Dashboard API error: %s", e)
         return render_template('dashboard.html', 
                              user=session['user'], 
                              stats={}, 
@@ -128,13 +187,24 @@ def users_list():
     if not is_authenticated():
         return redirect(url_for('login'))
     
+    # La recherche remplace les filtres: /users/search classe par pertinence
+    query = request.args.get('q', '').strip()
+    if query:
+        filters = {'q': query}
+    else:
+        filters = {k: v for k, v in request.args.items() if k in ('role', 'is_active') and v}
+    params = {**filters, 'limit': min(USERS_PAGE_SIZE, SEARCH_PAGE_SIZE) if query else USERS_PAGE_SIZE}
+    if request.args.get('cursor'):
+        params['cursor'] = request.args['cursor']
+    
     try:
-        response = requests.get(f"{API_BASE_URL}/users/", timeout=10)
-        users = response.json() if response.status_code == 200 else []
-        return render_template('users.html', users=users, user=session['user'])
+        users, next_cursor = fetch_users_page(params)
+        return render_template('users.html', users=users, user=session['user'],
+                             filters=filters, next_cursor=next_cursor)
     except requests.exceptions.RequestException as e:
-        logger.error(f"Users list API error: {e}")
-        return render_template('users.html', users=[], error="API unreachable", user=session['user'])
+        logger.error("Users list API error: %s", e)
+        return render_template('users.html', users=[], error="API unreachable", user=session['user'],
+                             filters=filters, next_cursor=None)
 
 @app.route('/profile')
 def profile():
@@ -148,18 +218,17 @@ def reports():
         return redirect(url_for('login'))
     
     try:
-        response = requests.get(f"{API_BASE_URL}/users/", timeout=10)
-        users = response.json() if response.status_code == 200 else []
+        summary = fetch_user_stats(recent=0)
         
         # Génération de rapports
         reports_data = {
-            'user_activity': generate_user_activity_report(users),
-            'role_distribution': generate_role_distribution(users),
+            'user_activity': generate_user_activity_report(summary),
+            'role_distribution': generate_role_distribution(summary),
         }
         
         return render_template('reports.html', reports=reports_data, user=session['user'])
     except requests.exceptions.RequestException as e:
-        logger.error(f"Reports API error: {e}")
+        logger.error("Reports API error: %s", e)
         return render_template('reports.html', reports={}, error="API unreachable", user=session['user'])
 
 @app.route('/settings')
@@ -184,17 +253,18 @@ def create_user():
     }
     
     try:
-        response = requests.post(f"{API_BASE_URL}/users/", json=data, timeout=10)
+        response = api_write("POST", "/users/", "users.create", json=data)
+        api_cache.invalidate('users.list', 'users.search', 'users.stats')
         if response.status_code == 200:
             flash('User created successfully!', 'success')
-            logger.info(f"User created: {data['username']}")
+            logger.info("User created: %s", data['username'])
         else:
             error_msg = response.json().get('detail', 'Error creating user')
             flash(f'Error: {error_msg}', 'error')
-            logger.error(f"User creation failed: {error_msg}")
+            logger.error("User creation failed: %s", error_msg)
     except requests.exceptions.RequestException as e:
         flash('API unreachable, please try again later', 'error')
-        logger.error(f"User creation API error: {e}")
+        logger.error("User creation API error: %s", e)
     
     return redirect(url_for('users_list'))
 
@@ -204,20 +274,50 @@ def delete_user(user_id):
         return jsonify({'success': False, 'error': 'Permission denied'})
     
     try:
-        response = requests.delete(f"{API_BASE_URL}/users/{user_id}", timeout=10)
+        response = api_write("DELETE", f"/users/{user_id}", "users.delete")
+        api_cache.invalidate('users.list', 'users.search', 'users.stats')
         success = response.status_code == 200
         if success:
-            logger.info(f"User deleted: {user_id}")
+            logger.info("User deleted: %s", user_id)
         return jsonify({'success': success})
     except requests.exceptions.RequestException as e:
-        logger.error(f"Delete user API error: {e}")
+        logger.error("Delete user API error: %s", e)
         return jsonify({'success': False, 'error': 'API unreachable'})
 
+@app.route('/changes')
+def user_changes():
+    """Changes since ?since= for the live refresh of users.html and dashboard.html:
+    a few bytes per poll instead of the whole list"""
+    if not is_authenticated():
+        return jsonify({'error': 'Not authenticated'}), 401
+    since = request.args.get('since', '')
+    params = {'since': since} if since.isdigit() else {}
+    try:
+        response = api.get("/users/changes", "users.changes", params=params)
+    except requests.exceptions.RequestException as e:
+        logger.warning("Changes API error: %s", e)
+        return jsonify({'error': 'API unreachable'}), 502
+    if response.status_code == 410:
+        # Journal dépassé: la page se recharge entièrement
+        api_cache.invalidate('users.list', 'users.search', 'users.stats')
+        return jsonify({'reset': True})
+    if response.status_code != 200:
+        return jsonify({'error': 'API error'}), 502
+    body = response.json()
+    if body['changes']:
+        # Écritures d'autres clients ou workers: le cache ne doit pas les masquer
+        api_cache.invalidate('users.list', 'users.search', 'users.stats')
+    return jsonify({'version': body['version'], 'changes': len(body['changes'])})
+
+@app.route('/metrics')
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
 @app.route('/health')
 def health_check():
     try:
         # Vérifier la santé de l'API
-        api_response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+        api_response = api.get("/health", "health")
         api_status = api_response.status_code == 200
         
         return jsonify({
@@ -233,23 +333,19 @@ def health_check():
         }), 500
 
 # Fonctions utilitaires
-def generate_user_activity_report(users):
-    active_users = len([u for u in users if u.get('is_active', True)])
-    inactive_users = len(users) - active_users
+def generate_user_activity_report(summary):
+    active_users = summary['active']
+    inactive_users = summary['total'] - active_users
     return {
         'active': active_users,
         'inactive': inactive_users,
-        'percentage_active': (active_users / len(users) * 100) if users else 0
+        'percentage_active': (active_users / summary['total'] * 100) if summary['total'] else 0
     }
 
-def generate_role_distribution(users):
-    roles = {}
-    for user in users:
-        role = user.get('role', 'user')
-        roles[role] = roles.get(role, 0) + 1
-    return roles
+def generate_role_distribution(summary):
+    return dict(summary['roles'])
 
 if __name__ == '__main__':
-    logger.info(f"Starting Flask client on 0.0.0.0:8083")
-    logger.info(f"API endpoint: {API_BASE_URL}")
+    logger.info("Starting Flask client on 0.0.0.0:8083")
+    logger.info("API endpoint: %s", API_BASE_URL)
     app.run(host='0.0.0.0', port=8083, debug=False)
\ No newline at end of file
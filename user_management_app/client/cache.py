@@ -0,0 +1,99 @@
+"""In-process cache for API responses in the Flask client.
+
+Entries live for a per-resource TTL in a size-bounded LRU. Concurrent misses
+on the same key wait for a single loader call instead of all hitting the API
+(stampede protection). The client's own writes invalidate whole resources.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "10"))
+RESOURCE_TTLS = {
+    "users.list": float(os.getenv("CACHE_USERS_LIST_TTL", "10")),
+    "users.search": float(os.getenv("CACHE_USERS_SEARCH_TTL", "10")),
+    "users.stats": float(os.getenv("CACHE_USERS_STATS_TTL", "15")),
+}
+
+CACHE_HITS = Counter('client_cache_hits_total', 'API response cache hits', ['resource'])
+CACHE_MISSES = Counter('client_cache_misses_total', 'API response cache misses', ['resource'])
+CACHE_EVICTIONS = Counter('client_cache_evictions_total', 'API response cache evictions', ['resource', 'reason'])
+
+
+class ResponseCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttls=None, default_ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttls = {**RESOURCE_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        # Incrémenté à chaque invalidation: un chargement commencé avant n'est pas mis en cache
+        self._generation = 0
+
+    def _lookup(self, key):
+        """Return (found, value), dropping the entry if it expired. Lock held."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            CACHE_EVICTIONS.labels(resource=key[0], reason="expired").inc()
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get_or_load(self, resource, params, loader):
+        """Return the cached value for (resource, params) or call loader() once"""
+        key = (resource, params)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                CACHE_HITS.labels(resource=resource).inc()
+                return value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Un autre thread a pu charger la valeur pendant l'attente
+            with self._lock:
+                found, value = self._lookup(key)
+            if found:
+                CACHE_HITS.labels(resource=resource).inc()
+                return value
+            CACHE_MISSES.labels(resource=resource).inc()
+            generation = self._generation
+            try:
+                value = loader()
+                if generation == self._generation:
+                    self.set(resource, params, value)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+            return value
+
+    def set(self, resource, params, value):
+        ttl = self.ttls.get(resource, self.default_ttl)
+        with self._lock:
+            self._entries[(resource, params)] = (self.clock() + ttl, value)
+            self._entries.move_to_end((resource, params))
+            while len(self._entries) > self.max_entries:
+                (evicted, _), _ = self._entries.popitem(last=False)
+                CACHE_EVICTIONS.labels(resource=evicted, reason="size").inc()
+
+    def invalidate(self, *resources):
+        """Drop every entry of the given resources"""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[0] in resources]:
+                del self._entries[key]
+                CACHE_EVICTIONS.labels(resource=key[0], reason="invalidated").inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,147 @@
+"""Logging setup: JSON lines written by a background thread, with sampling.
+
+setup_logging() replaces the root handlers with a QueueHandler. The request
+thread only merges the message arguments and puts the record on a bounded
+queue; a QueueListener thread serialises it and writes it to stdout. When the
+queue is full the record is dropped rather than blocking the request.
+
+Call sites pass arguments instead of f-strings, so nothing is formatted for
+filtered-out levels, and tag high-volume messages with an event name:
+
+    logger.info("Login successful for user: %s", username, extra={"event": "login.success"})
+
+LOG_SAMPLE_RATES ("event=rate,...") keeps only that fraction of an event's
+records; kept records carry their sample_rate so counts can be scaled back.
+Every record not written is counted in log_messages_dropped_total.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from prometheus_client import Counter
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json ou text (lisible en développement)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+DEFAULT_SAMPLE_RATES = "dashboard=0.1,login.attempt=0.1"
+
+LOG_DROPPED = Counter('log_messages_dropped_total', 'Log records not written', ['reason'])
+
+# Attributs propres à LogRecord: tout le reste vient de extra= et part dans le JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def parse_sample_rates(value):
+    """{"event": rate} from "event=rate,..."; rates are clamped to [0, 1]"""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", DEFAULT_SAMPLE_RATES))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, event and extra fields"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of the records of each sampled event"""
+
+    def __init__(self, rates=None, rand=random.random):
+        super().__init__()
+        self.rates = LOG_SAMPLE_RATES if rates is None else rates
+        self.rand = rand
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1:
+            return True
+        if self.rand() >= rate:
+            LOG_DROPPED.labels(reason="sampled").inc()
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: drops and counts when the queue is full"""
+
+    def prepare(self, record):
+        # Seule la fusion msg % args reste sur le thread de la requête, le JSON est fait par le listener
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.labels(reason="queue_full").inc()
+
+
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Route the root logger through the queue; returns the running QueueListener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    output = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(handler.queue, output)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _flush():
+    # Vide la file avant la sortie du processus
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -26,4 +26,23 @@ document.addEventListener('DOMContentLoaded', function() {
             form.reset();
         });
     }
-});
\ No newline at end of file
+});
+
+// Recharge la page quand des utilisateurs changent: le client interroge /changes
+// (quelques octets) au lieu de redemander toute la liste
+function watchUserChanges(interval) {
+    let version = null;
+    let stale = false;
+    const poll = () => fetch(version === null ? '/changes' : `/changes?since=${version}`)
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (!data) return;
+            if (data.reset || (version !== null && data.changes > 0)) stale = true;
+            if (!data.reset) version = data.version;
+            // Pas de rechargement pendant la saisie dans une modale
+            if (stale && !document.querySelector('.modal.show')) location.reload();
+        })
+        .catch(() => {})
+        .finally(() => setTimeout(poll, interval));
+    poll();
+}
@@ -7,12 +7,54 @@ CREATE TABLE IF NOT EXISTS users (
     last_name VARCHAR(50),
     role VARCHAR(20) DEFAULT 'user',
     is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    -- UTC naïf, même horloge que l'ORM (utils.utcnow) pour le curseur (created_at, id)
+    created_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'utc'),
+    updated_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'utc')
 );
 
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+-- Pagination par curseur sur (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at, id);
+-- Recherche (GET /users/search): LIKE 'q%' et '%q%' sur les champs en minuscules
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_first_name_trgm ON users USING gin (lower(first_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_last_name_trgm ON users USING gin (lower(last_name) gin_trgm_ops);
+
+-- Journal des changements (GET /users/changes): une ligne par écriture, via trigger,
+-- pour que tous les workers voient tout; garde les 100000 dernières (CHANGE_LOG_SIZE)
+CREATE TABLE IF NOT EXISTS user_changes (
+    version BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    type VARCHAR(10) NOT NULL,
+    changed_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+CREATE OR REPLACE FUNCTION log_user_change() RETURNS trigger AS $$
+DECLARE
+    logged BIGINT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_changes (user_id, type) VALUES (NEW.id, 'created') RETURNING version INTO logged;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO user_changes (user_id, type) VALUES (OLD.id, 'deleted') RETURNING version INTO logged;
+    -- Champs publics seulement: un rehash du mot de passe n'est pas un changement
+    ELSIF (OLD.username, OLD.email, OLD.first_name, OLD.last_name, OLD.role, OLD.is_active)
+          IS DISTINCT FROM (NEW.username, NEW.email, NEW.first_name, NEW.last_name, NEW.role, NEW.is_active) THEN
+        INSERT INTO user_changes (user_id, type) VALUES (NEW.id, 'updated') RETURNING version INTO logged;
+    END IF;
+    IF logged IS NOT NULL THEN
+        DELETE FROM user_changes WHERE version <= logged - 100000;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_changes ON users;
+CREATE TRIGGER users_changes AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION log_user_change();
 
 -- Insertion d'un utilisateur admin par défaut (mot de passe: admin)
 INSERT INTO users (username, email, password_hash, first_name, last_name, role)
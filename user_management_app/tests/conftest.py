@@ -1,6 +1,22 @@
+import asyncio
+import os
+import sys
+
 import pytest
 import requests
 
+# Clé JWT de développement: tokens.py refuse de démarrer sans JWT_KEYS sinon
+os.environ.setdefault("JWT_DEV_KEYS", "true")
+
+# Les modules de l'API s'importent à plat (cf. Dockerfile: "app:app")
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+# Le client Flask a aussi un module "app": seuls ses modules annexes vont dans le path
+CLIENT_DIR = os.path.join(os.path.dirname(API_DIR), "client")
+if CLIENT_DIR not in sys.path:
+    sys.path.append(CLIENT_DIR)
+
 @pytest.fixture
 def api_url():
     return "http://localhost:5002"
@@ -10,4 +26,145 @@ def admin_credentials():
     return {
         "username": "admin",
         "password": "admin"
-    }
\ No newline at end of file
+    }
+
+def backend_client(backend):
+    """TestClient on the full API with the given storage backend"""
+    from fastapi.testclient import TestClient
+    import app as api_app
+    from backends import get_backend
+
+    api_app.app.dependency_overrides[get_backend] = lambda: backend
+    # Seaux de tentatives de login propres à chaque test
+    api_app.login_rate_limiter.clear()
+    client = TestClient(api_app.app)
+    # Les tests agissent en admin: création et suppression exigent un jeton admin
+    client.headers["Authorization"] = f"Bearer {admin_token()}"
+    yield client
+    api_app.app.dependency_overrides.pop(get_backend, None)
+
+
+def admin_token():
+    from tokens import Denylist, token_service
+
+    # Révocations d'un test précédent (suppression de l'admin) remises à zéro
+    token_service.denylist = Denylist()
+    return token_service.issue({"id": 1, "role": "admin"})["access_token"]
+
+
+@pytest.fixture
+def memory_backend():
+    """In-memory backend with only the admin user"""
+    from backends import ADMIN_USER, MemoryBackend
+    from store import UserStore
+
+    return MemoryBackend(UserStore([ADMIN_USER]))
+
+
+@pytest.fixture
+def memory_client(memory_backend):
+    yield from backend_client(memory_backend)
+
+
+ADMIN_PASSWORD_HASH = "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918"
+
+
+def seed_sql(sync_engine):
+    """Same admin as init.sql and the in-memory store"""
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from models import User
+
+    Base.metadata.create_all(bind=sync_engine)
+    with sessionmaker(bind=sync_engine)() as db:
+        db.add(User(username="admin", email="admin@example.com", role="admin",
+                    password_hash=ADMIN_PASSWORD_HASH, first_name="Admin", last_name="User"))
+        db.commit()
+
+
+@pytest.fixture
+def sql_backend():
+    """SQL backend in sync mode, on in-memory SQLite"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from backends import SqlBackend
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    seed_sql(engine)
+    yield SqlBackend(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    engine.dispose()
+
+
+@pytest.fixture
+def sql_client(sql_backend):
+    yield from backend_client(sql_backend)
+
+
+@pytest.fixture
+def async_sql_backend(tmp_path):
+    """SQL backend in async mode, on aiosqlite"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import NullPool
+    from backends import SqlBackend
+
+    url = f"sqlite:///{tmp_path / 'users.db'}"
+    sync_engine = create_engine(url)
+    seed_sql(sync_engine)
+    # NullPool: chaque requête ouvre sa connexion dans la boucle du TestClient
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    yield SqlBackend(async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False))
+    # Fermé dans une boucle encore ouverte: sinon aiosqlite finit sur "Event loop is closed"
+    asyncio.run(async_engine.dispose())
+    sync_engine.dispose()
+
+
+@pytest.fixture
+def async_sql_client(async_sql_backend):
+    yield from backend_client(async_sql_backend)
+
+
+@pytest.fixture(params=["memory_client", "sql_client", "async_sql_client"])
+def client(request):
+    """Run a test against the in-memory API and the SQLAlchemy API in both modes"""
+    return request.getfixturevalue(request.param)
+
+
+@pytest.fixture
+def fake_api():
+    """Local HTTP server answering from a queue of (status, json body) responses"""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"responses": [], "requests": [], "connections": set()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _answer(self):
+            state["requests"].append((self.command, self.path, dict(self.headers)))
+            state["connections"].add(self.client_address)
+            status, body, headers = state["responses"].pop(0) if state["responses"] else (200, {}, {})
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = do_DELETE = do_PUT = _answer
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+
+import backends
+
+
+def test_crud_through_backend(client):
+    """Test create, get, update, login, delete and health on every backend"""
+    created = client.post("/users/", json={"username": "alice", "email": "alice@example.com", "password": "pw"})
+    assert created.status_code == 200
+    user_id = created.json()["id"]
+    assert "password_hash" not in created.json()
+    assert client.post("/users/", json={"username": "alice", "email": "x@example.com", "password": "pw"}).status_code == 400
+
+    updated = client.put(f"/users/{user_id}", json={"role": "admin", "is_active": False, "first_name": ""})
+    assert updated.status_code == 200
+    assert (updated.json()["role"], updated.json()["is_active"]) == ("admin", False)
+    assert client.get(f"/users/{user_id}").json() == updated.json()
+    assert client.put(f"/users/{user_id}", json={"username": "admin"}).status_code == 400
+    assert client.put("/users/999", json={"role": "admin"}).status_code == 404
+
+    login = client.post("/auth/login", json={"username": "alice", "password": "pw"})
+    assert login.status_code == 200
+    assert login.json()["id"] == user_id
+    assert client.get("/health").json()["users_count"] == 2
+
+    assert client.delete(f"/users/{user_id}").status_code == 200
+    assert client.get(f"/users/{user_id}").status_code == 404
+    assert client.delete(f"/users/{user_id}").status_code == 404
+    assert client.post("/auth/login", json={"username": "alice", "password": "pw"}).status_code == 401
+
+
+def test_sqlite_backend_is_shared(tmp_path, monkeypatch):
+    """Test that two sqlite backends (two workers) on one file see the same users"""
+    monkeypatch.setattr(backends, "SQLITE_URL", f"sqlite:///{tmp_path / 'users.db'}")
+    first, second = backends.make_backend("sqlite"), backends.make_backend("sqlite")
+
+    async def check():
+        assert (await first.get_by_username("admin"))["role"] == "admin"
+        created = await first.create({"username": "bob", "email": "bob@example.com", "password_hash": "x",
+                                      "first_name": None, "last_name": None, "role": "user", "is_active": True})
+        assert (await second.get(created["id"]))["username"] == "bob"
+        assert await second.count() == 2
+        async with second.session() as db:
+            return (await backends.execute(db, text("PRAGMA journal_mode"))).scalar_one()
+
+    assert asyncio.run(check()) == "wal"
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        backends.make_backend("redis")
+
+
+def test_sync_sessions_wait_for_a_free_connection(tmp_path):
+    """Test more concurrent sync reads than pooled connections do not deadlock the threadpool"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from conftest import seed_sql
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}", pool_size=2, max_overflow=0, pool_timeout=5)
+    seed_sql(engine)
+    backend = backends.SqlBackend(sessionmaker(bind=engine))
+    assert backend.pool_capacity == 2
+
+    async def burst():
+        return await asyncio.gather(*(backend.get(1) for _ in range(100)))
+
+    try:
+        assert all(user["username"] == "admin" for user in asyncio.run(burst()))
+    finally:
+        engine.dispose()
+
+
+def test_backend_created_once_across_threads(monkeypatch):
+    """Test concurrent first calls to get_backend (threadpool) build a single backend"""
+    made = []
+
+    def slow_make_backend():
+        time.sleep(0.01)
+        made.append(object())
+        return made[-1]
+
+    monkeypatch.setattr(backends, "_backend", None)
+    monkeypatch.setattr(backends, "make_backend", slow_make_backend)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: backends.get_backend(), range(8)))
+    assert len(made) == 1 and all(r is made[0] for r in results)
+
+
+@pytest.fixture(params=["sql_backend", "async_sql_backend"])
+def counted_sql(request):
+    """TestClient on a SQL backend, with the list of statements sent to the database"""
+    from sqlalchemy import event
+    from conftest import backend_client
+
+    backend = request.getfixturevalue(request.param)
+    engine = getattr(backend.engine, "sync_engine", backend.engine)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    for client in backend_client(backend):
+        yield client, statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_writes_take_one_statement(counted_sql):
+    """Test that create, update and delete are each a single statement with RETURNING"""
+    client, statements = counted_sql
+
+    def count(method, path, **kwargs):
+        statements.clear()
+        response = client.request(method, path, **kwargs)
+        return response.status_code, len(statements)
+
+    assert count("POST", "/users/", json={"username": "eve", "email": "eve@example.com", "password": "pw"}) == (200, 1)
+    user_id = client.get("/users/", params={"role": "user"}).json()[0]["id"]
+    assert count("POST", "/users/", json={"username": "eve", "email": "x@example.com", "password": "pw"}) == (400, 1)
+    assert count("PUT", f"/users/{user_id}", json={"role": "admin"}) == (200, 1)
+    assert count("PUT", f"/users/{user_id}", json={"email": "admin@example.com"}) == (400, 1)
+    assert count("PUT", "/users/999", json={"role": "admin"}) == (404, 1)
+    assert count("DELETE", f"/users/{user_id}") == (200, 1)
+    assert count("DELETE", f"/users/{user_id}") == (404, 1)
@@ -0,0 +1,81 @@
+def test_bulk_import_json(client):
+    """Test JSON import with a per-row report"""
+    payload = [
+        {"username": "alice", "email": "alice@example.com", "password": "secret"},
+        {"username": "admin", "email": "other@example.com", "password": "secret"},
+        {"username": "bob", "email": "alice@example.com", "password": "secret"},
+        {"username": "carol", "email": "carol@example.com"},
+        {"username": "dave", "email": "dave@example.com", "password": "secret", "role": "admin"},
+    ]
+    response = client.post("/users/bulk", json=payload)
+    assert response.status_code == 200
+    report = response.json()
+
+    assert report["created"] == 2
+    assert report["failed"] == 3
+    statuses = [r["status"] for r in report["results"]]
+    assert statuses == ["created", "error", "error", "error", "created"]
+    assert "password" in report["results"][3]["error"]
+
+    users = {u["username"]: u for u in client.get("/users/").json()}
+    assert users["dave"]["role"] == "admin"
+    assert report["results"][0]["id"] == users["alice"]["id"]
+
+
+def test_bulk_import_csv(client):
+    """Test CSV upload import"""
+    body = "username,email,password,first_name\nerin,erin@example.com,pw,Erin\nfrank,frank@example.com,pw,\n"
+    response = client.post("/users/bulk", files={"file": ("users.csv", body, "text/csv")})
+    assert response.status_code == 200
+    assert response.json()["created"] == 2
+
+    users = {u["username"]: u for u in client.get("/users/").json()}
+    assert users["erin"]["first_name"] == "Erin"
+    assert users["frank"]["first_name"] is None
+
+
+def test_bulk_import_rejects_non_array(client):
+    """Test that the body must be an array"""
+    assert client.post("/users/bulk", json={"username": "x"}).status_code == 400
+
+
+def seed_team(client):
+    client.post("/users/bulk", json=[
+        {"username": f"sales{i}", "email": f"sales{i}@example.com", "password": "pw", "role": "sales"}
+        for i in range(3)
+    ] + [{"username": "dev", "email": "dev@example.com", "password": "pw", "role": "dev"}])
+    return {u["username"]: u["id"] for u in client.get("/users/").json()}
+
+
+def test_bulk_update_by_filter(client):
+    """Test a dry run, then a set-based update selected by role"""
+    ids = seed_team(client)
+    payload = {"filter": {"role": "sales"}, "changes": {"is_active": False}, "dry_run": True}
+
+    dry = client.post("/users/bulk/update", json=payload).json()
+    assert dry == {"dry_run": True, "matched": 3, "updated": 0, "ids": sorted(ids[f"sales{i}"] for i in range(3))}
+    assert client.get("/users/", params={"is_active": False}).json() == []
+
+    done = client.post("/users/bulk/update", json={**payload, "dry_run": False}).json()
+    assert (done["matched"], done["updated"]) == (3, 3)
+    inactive = client.get("/users/", params={"is_active": False}).json()
+    assert sorted(u["username"] for u in inactive) == ["sales0", "sales1", "sales2"]
+    assert client.get(f"/users/{ids['sales0']}").json()["is_active"] is False
+
+
+def test_bulk_delete_by_ids_and_filter(client):
+    """Test that ids and filters combine, and unknown ids are ignored"""
+    ids = seed_team(client)
+    selection = {"ids": [ids["sales0"], ids["dev"], 999], "role": "sales"}
+
+    response = client.post("/users/bulk/delete", json={"filter": selection})
+    assert response.json() == {"dry_run": False, "matched": 1, "deleted": 1, "ids": [ids["sales0"]]}
+    assert client.get(f"/users/{ids['sales0']}").status_code == 404
+    assert client.get(f"/users/{ids['dev']}").status_code == 200
+
+
+def test_bulk_update_requires_selection(client):
+    """Test that an empty filter cannot touch the whole table"""
+    assert client.post("/users/bulk/delete", json={"filter": {}}).status_code == 400
+    assert client.post("/users/bulk/update", json={"filter": {"role": "user"}, "changes": {}}).status_code == 400
+    assert client.post("/users/bulk/update", json={"filter": {"ids": [1]}, "changes": {"username": "x"}}).status_code == 400
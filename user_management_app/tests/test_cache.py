@@ -0,0 +1,79 @@
+import threading
+import time
+
+from cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_ttl_per_resource():
+    """Test hits within the TTL and reload after expiry"""
+    clock = FakeClock()
+    cache = ResponseCache(ttls={"users.list": 10}, clock=clock)
+    calls = []
+
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_load("users.list", (), load) == 1
+    clock.now = 9
+    assert cache.get_or_load("users.list", (), load) == 1
+    clock.now = 11
+    assert cache.get_or_load("users.list", (), load) == 2
+
+
+def test_cache_lru_bound_and_invalidation():
+    """Test LRU eviction and resource invalidation"""
+    cache = ResponseCache(max_entries=2)
+    cache.set("users.list", 1, "a")
+    cache.set("users.list", 2, "b")
+    cache.get_or_load("users.list", 1, lambda: "reload")
+    cache.set("users.stats", 5, "c")
+
+    assert cache.get_or_load("users.list", 2, lambda: "evicted") == "evicted"
+    cache.invalidate("users.list")
+    assert cache.get_or_load("users.stats", 5, lambda: "miss") == "c"
+    assert cache.get_or_load("users.list", 1, lambda: "fresh") == "fresh"
+
+
+def test_cache_stampede_protection():
+    """Test that concurrent misses call the loader once"""
+    cache = ResponseCache()
+    calls = []
+
+    def slow_load():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("users.stats", 5, slow_load)))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ["value"] * 10
+    assert len(calls) == 1
+
+
+def test_cache_does_not_store_failures():
+    """Test that a loader exception is not cached"""
+    cache = ResponseCache()
+
+    def fail():
+        raise RuntimeError("API down")
+
+    try:
+        cache.get_or_load("users.list", (), fail)
+    except RuntimeError:
+        pass
+    assert cache.get_or_load("users.list", (), lambda: "ok") == "ok"
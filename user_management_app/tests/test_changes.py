@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from changes import RESET, ChangeFeed, ChangeLog, ChangesExpiredError, change_feed, check_since, event_stream
+
+
+def new_user(name):
+    return {"username": name, "email": f"{name}@example.com", "password": "pw"}
+
+
+def current_version(client):
+    return client.get("/users/changes").json()["version"]
+
+
+def test_changes_since_lists_writes(client):
+    """Test creates, updates and deletes come back in version order"""
+    since = current_version(client)
+    ann = client.post("/users/", json=new_user("ann")).json()
+    bob = client.post("/users/", json=new_user("bob")).json()
+    client.put(f"/users/{ann['id']}", json={"first_name": "Ann"})
+    client.delete(f"/users/{bob['id']}")
+
+    body = client.get("/users/changes", params={"since": since}).json()
+    assert [(c["type"], c["id"]) for c in body["changes"]] == [
+        ("created", ann["id"]), ("created", bob["id"]), ("updated", ann["id"]), ("deleted", bob["id"])]
+    assert body["version"] == body["changes"][-1]["version"] == since + 4
+    assert body["changes"][2]["user"]["first_name"] == "Ann"
+    assert "password_hash" not in body["changes"][2]["user"]
+    # Utilisateur lu avec l'événement: None une fois supprimé
+    assert body["changes"][1]["user"] is None and body["changes"][3]["user"] is None
+    assert client.get("/users/changes", params={"since": body["version"]}).json()["changes"] == []
+
+
+def test_changes_paginate_and_expire(client):
+    since = current_version(client)
+    client.post("/users/bulk", json=[new_user(f"user{i}") for i in range(3)])
+    page = client.get("/users/changes", params={"since": since, "limit": 2}).json()
+    assert len(page["changes"]) == 2 and page["has_more"]
+    rest = client.get("/users/changes", params={"since": page["version"]}).json()
+    assert len(rest["changes"]) == 1 and not rest["has_more"]
+    # Version inconnue (journal remis à zéro): le client doit tout recharger
+    assert client.get("/users/changes", params={"since": rest["version"] + 5}).status_code == 410
+
+
+def test_password_rehash_is_not_a_change(client):
+    since = current_version(client)
+    assert client.post("/auth/login", json={"username": "admin", "password": "admin"}).status_code == 200
+    assert current_version(client) == since
+
+
+def test_change_log_is_bounded():
+    log = ChangeLog(size=3)
+    for user_id in range(5):
+        log.append("created", user_id)
+    events, oldest, latest = log.since(3, 10)
+    assert [e[0] for e in events] == [4, 5] and (oldest, latest) == (3, 5)
+    check_since(2, oldest, latest)
+    with pytest.raises(ChangesExpiredError):
+        check_since(1, oldest, latest)
+
+
+def test_stream_catches_up_then_follows(memory_backend):
+    """Test the SSE stream replays the events after since, then the live ones"""
+    async def run():
+        await memory_backend.create({"username": "ann", "email": "ann@example.com", "password_hash": "x"})
+        feed = change_feed(memory_backend)
+        feed.interval = 0.01
+        stream = event_stream(memory_backend, 0, heartbeat=0.05)
+        replayed = await stream.__anext__()
+        await memory_backend.delete(1)
+        live = await stream.__anext__()
+        keepalive = await stream.__anext__()
+        await stream.aclose()
+        return replayed, live, keepalive, feed
+
+    replayed, live, keepalive, feed = asyncio.run(run())
+    assert replayed.startswith("id: 1\nevent: created\ndata: ") and '"username":"ann"' in replayed
+    assert live.startswith("id: 2\nevent: deleted\n")
+    assert keepalive == ": keepalive\n\n"
+    assert not feed.subscribers
+
+
+def test_lagging_subscriber_is_reset(memory_backend):
+    async def run():
+        feed = ChangeFeed(memory_backend, buffer=2)
+        slow = await feed.subscribe()
+        for version in range(1, 4):
+            feed.publish({"version": version})
+        return feed, slow
+
+    feed, slow = asyncio.run(run())
+    assert slow.queue.qsize() == 1 and slow.queue.get_nowait() is RESET
+    assert slow not in feed.subscribers
+
+
+def test_stream_endpoint_resets_unknown_versions(client):
+    response = client.get("/users/changes/stream", params={"since": 1000})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("event: reset\n")
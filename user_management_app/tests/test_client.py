@@ -0,0 +1,49 @@
+from prometheus_client import REGISTRY
+
+from api_client import ApiClient
+
+
+def test_api_client_reuses_connections(fake_api):
+    """Test keep-alive: several calls go through a single TCP connection"""
+    api = ApiClient(fake_api["url"])
+    for _ in range(5):
+        assert api.get("/users/", "users.list").status_code == 200
+    assert len(fake_api["connections"]) == 1
+    api.close()
+
+
+def test_api_client_retries_idempotent_calls(fake_api):
+    """Test that GET is retried on 503 but POST is not"""
+    api = ApiClient(fake_api["url"], backoff=0)
+    fake_api["responses"] = [(503, {}, {}), (200, {"ok": True}, {})]
+    assert api.get("/health", "health").json() == {"ok": True}
+    assert len(fake_api["requests"]) == 2
+
+    fake_api["responses"] = [(503, {}, {}), (200, {}, {})]
+    assert api.post("/users/", "users.create", json={}).status_code == 503
+    assert len(fake_api["requests"]) == 3
+    api.close()
+
+
+def test_api_client_metrics(fake_api):
+    """Test per-call timing exported to Prometheus"""
+    labels = {"endpoint": "users.stats", "method": "GET", "status": "200"}
+    before = REGISTRY.get_sample_value("api_client_request_duration_seconds_count", labels) or 0
+    api = ApiClient(fake_api["url"])
+    api.get("/users/stats", "users.stats")
+    assert REGISTRY.get_sample_value("api_client_request_duration_seconds_count", labels) == before + 1
+    api.close()
+
+
+def test_api_client_conditional_get(fake_api):
+    """Test that the stored ETag is sent back and a 304 reuses the body"""
+    api = ApiClient(fake_api["url"])
+    fake_api["responses"] = [(200, [{"id": 1}], {"ETag": '"v1"'}), (304, {}, {"ETag": '"v1"'})]
+
+    first = api.get("/users/", "users.list", params={"limit": 5})
+    second = api.get("/users/", "users.list", params={"limit": 5})
+
+    assert second.json() == first.json() == [{"id": 1}]
+    assert "If-None-Match" not in fake_api["requests"][0][2]
+    assert fake_api["requests"][1][2]["If-None-Match"] == '"v1"'
+    api.close()
@@ -0,0 +1,135 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backends import ADMIN_USER, MemoryBackend
+from coalesce import SingleFlight, single_flight
+from conftest import admin_token
+from store import UserStore
+
+
+class SlowBackend(MemoryBackend):
+    """Memory backend whose reads take a while and are counted"""
+
+    def __init__(self):
+        super().__init__(UserStore([ADMIN_USER]))
+        self.calls = {"list_users": 0, "get": 0}
+
+    async def list_users(self, filters, page):
+        self.calls["list_users"] += 1
+        await asyncio.sleep(0.05)
+        return await super().list_users(filters, page)
+
+    async def get(self, user_id):
+        self.calls["get"] += 1
+        await asyncio.sleep(0.05)
+        return await super().get(user_id)
+
+
+@pytest.fixture
+def slow_backend():
+    import app as api_app
+    from backends import get_backend
+
+    backend = SlowBackend()
+    api_app.app.dependency_overrides[get_backend] = lambda: backend
+    yield backend
+    api_app.app.dependency_overrides.pop(get_backend, None)
+
+
+def run_requests(*requests):
+    import app as api_app
+
+    async def run():
+        transport = httpx.ASGITransport(app=api_app.app)
+        headers = {"Authorization": f"Bearer {admin_token()}"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+            return await asyncio.gather(*(client.request(*r[:2], **(r[2] if len(r) > 2 else {}))
+                                         for r in requests))
+
+    return asyncio.run(run())
+
+
+def test_identical_reads_share_one_call(slow_backend):
+    """Test a burst of identical reads runs one storage call, distinct ones do not share"""
+    responses = run_requests(*[("GET", "/users/?limit=10")] * 10, ("GET", "/users/?limit=5"),
+                             *[("GET", "/users/1")] * 5)
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.content for r in responses[:10]}) == 1
+    assert responses[0].headers["ETag"] == responses[9].headers["ETag"]
+    assert responses[15].json()["username"] == "admin"
+    assert slow_backend.calls == {"list_users": 2, "get": 1}
+
+
+def test_missing_user_is_shared_404(slow_backend):
+    responses = run_requests(*[("GET", "/users/42")] * 3)
+    assert [r.status_code for r in responses] == [404] * 3
+    assert slow_backend.calls["get"] == 1
+
+
+def test_write_starts_fresh_reads():
+    """Test a read arriving after invalidate() does not join the call started before"""
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(len(calls))
+            await asyncio.sleep(0.02)
+            return len(calls)
+
+        first = asyncio.ensure_future(flight.do("users.list", "k", load))
+        await asyncio.sleep(0)
+        joined = asyncio.ensure_future(flight.do("users.list", "k", load))
+        await asyncio.sleep(0)
+        flight.invalidate()
+        fresh = await flight.do("users.list", "k", load)
+        return await first, await joined, fresh, calls
+
+    first, joined, fresh, calls = asyncio.run(run())
+    assert first == joined and len(calls) == 2 and fresh == 2
+
+
+def test_only_writes_invalidate(slow_backend, monkeypatch):
+    """Test a login leaves the reads in flight alone, a write starts fresh ones"""
+    login = ("POST", "/auth/login", {"json": {"username": "admin", "password": "admin"}})
+    # Premier login: réécrit l'ancien hash de l'admin, une vraie écriture
+    run_requests(login)
+    calls = []
+    monkeypatch.setattr(single_flight, "invalidate", lambda: calls.append(1))
+    login = run_requests(login)
+    assert login[0].status_code == 200 and calls == []
+    created = run_requests(("POST", "/users/", {"json": {"username": "alice", "email": "alice@example.com",
+                                                         "password": "secret123"}}))
+    assert created[0].status_code == 200 and calls == [1]
+
+
+def test_disabled_single_flight_calls_every_time():
+    async def run():
+        flight = SingleFlight(enabled=False)
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0)
+
+        await asyncio.gather(flight.do("r", "k", load), flight.do("r", "k", load))
+        return calls
+
+    assert len(asyncio.run(run())) == 2
+
+
+@pytest.mark.parametrize("path", ["/users/?limit=10", "/users/1"])
+def test_not_modified_skips_serialisation(client, monkeypatch, path):
+    """Test a 304 does not serialise the body, and a 200 serialises it once"""
+    import routes.users
+
+    calls = []
+    for name in ("users_body", "user_body"):
+        render = getattr(routes.users, name)
+        monkeypatch.setattr(routes.users, name, lambda *a, render=render: calls.append(1) or render(*a))
+    etag = client.get(path).headers["ETag"]
+    assert len(calls) == 1
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert len(calls) == 1
@@ -0,0 +1,33 @@
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from database import async_database_url, instrument_pool, timed_pool
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels)
+
+
+def test_async_database_url():
+    """Test the sync to async driver mapping"""
+    assert async_database_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_database_url("postgresql+psycopg2://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_database_url("sqlite:///users.db") == "sqlite+aiosqlite:///users.db"
+
+
+def test_pool_metrics(tmp_path):
+    """Test checked-out gauge, acquire histogram and invalidation counter"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=timed_pool(QueuePool, "test"), pool_size=2)
+    instrument_pool(engine.pool, "test")
+    acquired = sample("db_pool_acquire_duration_seconds_count", engine="test") or 0
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert sample("db_pool_checked_out_connections", engine="test") == 1
+        conn.invalidate()
+    assert sample("db_pool_checked_out_connections", engine="test") == 0
+    assert sample("db_pool_acquire_duration_seconds_count", engine="test") == acquired + 1
+    assert sample("db_pool_invalidations_total", engine="test", kind="hard") >= 1
+    assert sample("db_pool_size", engine="test") == 2
+    engine.dispose()
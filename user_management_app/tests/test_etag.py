@@ -0,0 +1,25 @@
+def test_list_etag_and_not_modified(client):
+    """Test If-None-Match on the list, and that a write changes the ETag"""
+    first = client.get("/users/", params={"limit": 10})
+    etag = first.headers["ETag"]
+
+    again = client.get("/users/", params={"limit": 10}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    client.post("/users/", json={"username": "new", "email": "new@example.com", "password": "pw"})
+    changed = client.get("/users/", params={"limit": 10}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_user_etag(client):
+    """Test conditional GET on a single user"""
+    response = client.get("/users/1")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    assert client.get("/users/1", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/users/1", headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+    assert client.get("/users/1", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert client.get("/users/999").status_code == 404
@@ -0,0 +1,42 @@
+import csv
+import io
+import json
+
+
+def create_users(client, count, role="user"):
+    for i in range(count):
+        client.post("/users/", json={
+            "username": f"{role}{i}",
+            "email": f"{role}{i}@example.com",
+            "password": "secret",
+            "role": role,
+        })
+
+
+def test_export_ndjson(client):
+    """Test NDJSON export: one object per line, no password hash"""
+    create_users(client, 4)
+    response = client.get("/users/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["id"] for r in records] == sorted(r["id"] for r in records)
+    assert len(records) == 5
+    assert all("password_hash" not in r for r in records)
+
+
+def test_export_csv_with_filters(client):
+    """Test CSV export honours the list filters"""
+    create_users(client, 3)
+    response = client.get("/users/export", params={"format": "csv", "role": "admin"})
+    assert response.status_code == 200
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [r["username"] for r in rows] == ["admin"]
+    assert "created_at" in rows[0]
+
+
+def test_export_rejects_unknown_format(client):
+    """Test that only ndjson and csv are accepted"""
+    assert client.get("/users/export", params={"format": "xml"}).status_code == 422
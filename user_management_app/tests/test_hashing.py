@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from hashing import HashingBusyError, PasswordHasher, make_context
+
+ADMIN_SHA256 = "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918"
+
+
+def test_hash_and_verify():
+    """Test hashing with the configured KDF"""
+    hasher = PasswordHasher(make_context(rounds=1000))
+    password_hash = hasher.hash("secret")
+    assert password_hash.startswith("$pbkdf2-sha256$1000$")
+    assert hasher.verify_and_update("secret", password_hash) == (True, None)
+    assert hasher.verify_and_update("wrong", password_hash) == (False, None)
+    assert hasher.verify_and_update("secret", "not-a-hash") == (False, None)
+
+
+def test_legacy_sha256_is_rehashed():
+    """Test that old SHA-256 hashes verify and come back upgraded"""
+    hasher = PasswordHasher(make_context(rounds=1000))
+    valid, new_hash = hasher.verify_and_update("admin", ADMIN_SHA256)
+    assert valid
+    assert new_hash.startswith("$pbkdf2-sha256$")
+
+
+def test_queue_limit_rejects():
+    """Test that a full queue raises HashingBusyError"""
+    hasher = PasswordHasher(make_context(rounds=1000), concurrency=1, max_queue=1)
+    release = threading.Event()
+    blocked = hasher._submit("hash", release.wait)
+    with pytest.raises(HashingBusyError):
+        hasher.hash("secret")
+    release.set()
+    blocked.result()
+    assert hasher.hash("secret")
+
+
+def test_login_rehashes_stored_password(memory_client, memory_backend):
+    """Test transparent rehash of the seeded admin on login"""
+    store = memory_backend.store
+    assert store.get_by_username("admin")["password_hash"] == ADMIN_SHA256
+    response = memory_client.post("/auth/login", json={"username": "admin", "password": "admin"})
+    assert response.status_code == 200
+    assert store.get_by_username("admin")["password_hash"].startswith("$pbkdf2-sha256$")
+    assert memory_client.post("/auth/login", json={"username": "admin", "password": "admin"}).status_code == 200
+    assert memory_client.post("/auth/login", json={"username": "admin", "password": "nope"}).status_code == 401
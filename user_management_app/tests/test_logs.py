@@ -0,0 +1,66 @@
+import io
+import json
+import logging
+import queue
+
+import pytest
+from prometheus_client import REGISTRY
+
+import logs
+
+
+@pytest.fixture(autouse=True)
+def default_logging():
+    yield
+    logs.setup_logging()
+
+
+def dropped(reason):
+    return REGISTRY.get_sample_value("log_messages_dropped_total", {"reason": reason}) or 0
+
+
+def test_json_lines_written_by_listener():
+    """Test records reach the stream as JSON, with extra fields, once the listener drains"""
+    stream = io.StringIO()
+    listener = logs.setup_logging(level="INFO", fmt="json", stream=stream)
+    logging.getLogger("test.logs").info("Login for %s", "alice", extra={"event": "login.success"})
+    listener.stop()
+    logs._listener = None
+
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry["message"] == "Login for alice"
+    assert entry["event"] == "login.success"
+    assert (entry["level"], entry["logger"]) == ("INFO", "test.logs")
+
+
+def test_filtered_level_is_not_formatted():
+    """Test arguments of a filtered-out record are never rendered"""
+    class Loud:
+        def __str__(self):
+            raise AssertionError("formatted")
+
+    logs.setup_logging(level="WARNING", stream=io.StringIO())
+    logging.getLogger("test.logs").info("value %s", Loud())
+
+
+def test_sampling_filter_drops_and_counts():
+    sampler = logs.SamplingFilter({"users.list": 0.25}, rand=iter([0.1, 0.9]).__next__)
+    record = logging.makeLogRecord({"msg": "list", "event": "users.list"})
+    before = dropped("sampled")
+
+    assert sampler.filter(record) and record.sample_rate == 0.25
+    assert not sampler.filter(logging.makeLogRecord({"msg": "list", "event": "users.list"}))
+    assert sampler.filter(logging.makeLogRecord({"msg": "login", "event": "login.failed"}))
+    assert dropped("sampled") == before + 1
+    assert logs.parse_sample_rates("root=0.01, users.list=2") == {"root": 0.01, "users.list": 1.0}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.DroppingQueueHandler(queue.Queue(1))
+    before = dropped("queue_full")
+    for _ in range(3):
+        handler.handle(logging.makeLogRecord({"msg": "hello %s", "args": ("world",)}))
+
+    assert dropped("queue_full") == before + 2
+    record = handler.queue.get_nowait()
+    assert (record.msg, record.args) == ("hello world", None)
@@ -0,0 +1,116 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from metrics import OVERFLOW_ENDPOINT, UNMATCHED_ENDPOINT, EndpointLabels
+
+
+def sample(endpoint, method="GET", status="200"):
+    return REGISTRY.get_sample_value(
+        "http_requests_total", {"method": method, "endpoint": endpoint, "status": status}) or 0
+
+
+def test_requests_labelled_by_route_template(memory_client):
+    """Test that ids do not end up in the endpoint label"""
+    before = sample("/users/{user_id}")
+    unmatched = sample(UNMATCHED_ENDPOINT, status="404")
+    memory_client.get("/users/1")
+    memory_client.get("/users/1")
+    memory_client.get("/no/such/path/42")
+
+    assert sample("/users/{user_id}") == before + 2
+    assert sample("/users/1") == 0
+    assert sample(UNMATCHED_ENDPOINT, status="404") == unmatched + 1
+
+
+def test_unknown_methods_share_a_label(memory_client):
+    """Test that arbitrary methods are not used as label values"""
+    before = sample("/users/{user_id}", method="OTHER", status="405")
+    memory_client.request("BREW", "/users/1")
+    assert sample("/users/{user_id}", method="OTHER", status="405") == before + 1
+    assert REGISTRY.get_sample_value(
+        "http_requests_total", {"method": "BREW", "endpoint": "/users/{user_id}", "status": "405"}) is None
+
+
+def test_endpoint_labels_are_capped():
+    """Test the overflow label once the cap is reached"""
+    app = FastAPI()
+    labels = EndpointLabels(max_labels=2)
+    seen = []
+
+    @app.middleware("http")
+    async def record(request, call_next):
+        response = await call_next(request)
+        seen.append(labels(request))
+        return response
+
+    for i in range(3):
+        app.get(f"/r{i}/{{item}}")(lambda item: {})
+    client = TestClient(app)
+    for path in ["/r0/a", "/r1/b", "/r2/c", "/r0/d"]:
+        client.get(path)
+
+    assert seen == ["/r0/{item}", "/r1/{item}", OVERFLOW_ENDPOINT, "/r0/{item}"]
+
+
+WORKER_SCRIPT = """
+import sys
+sys.path.insert(0, {api_dir!r})
+from fastapi.testclient import TestClient
+import app
+from tokens import token_service
+client = TestClient(app.app)
+client.headers["Authorization"] = "Bearer " + token_service.issue({{"id": 1, "role": "admin"}})["access_token"]
+client.get("/users/1")
+client.post("/users/", json={{"username": sys.argv[1], "email": sys.argv[1] + "@example.com", "password": "pw"}})
+if len(sys.argv) > 2:
+    print(client.get("/metrics").text)
+"""
+
+
+def test_multiprocess_metrics_are_merged(tmp_path, monkeypatch):
+    """Test that /metrics reports every worker, and live gauges only from live ones"""
+    import os
+    import subprocess
+    import sys
+
+    import app as api_app
+    from gunicorn_conf import child_exit, clear_multiproc_dir
+
+    metrics_dir = tmp_path / "metrics"
+    clear_multiproc_dir(str(metrics_dir))
+    # Le processus de test joue le rôle du master gunicorn
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(metrics_dir))
+    env = dict(os.environ)
+    script = WORKER_SCRIPT.format(api_dir=os.path.dirname(api_app.__file__))
+
+    def worker(*args):
+        return subprocess.run([sys.executable, "-c", script, *args], env=env, check=True,
+                              capture_output=True, text=True)
+
+    first = subprocess.Popen([sys.executable, "-c", script, "first"], env=env)
+    first.wait()
+    child_exit(None, first)
+    text = worker("second", "scrape").stdout
+
+    assert 'http_requests_total{endpoint="/users/{user_id}",method="GET",status="200"} 2.0' in text
+    assert 'http_requests_total{endpoint="/users/",method="POST",status="200"} 2.0' in text
+    assert "user_management_active_users 2.0" in text
+    # Les gauges "live" du premier worker (mort) ne sont plus agrégés
+    assert not list(metrics_dir.glob(f"gauge_live*_{first.pid}.db"))
+    assert list(metrics_dir.glob(f"counter_{first.pid}.db"))
+
+
+def test_metrics_survive_a_storage_failure(memory_client, memory_backend, monkeypatch):
+    """Test /metrics still answers and keeps the last active users value when stats fail"""
+    memory_client.get("/metrics")
+    before = REGISTRY.get_sample_value("user_management_active_users")
+
+    async def down(recent):
+        raise OSError("database unreachable")
+
+    monkeypatch.setattr(memory_backend, "stats", down)
+    response = memory_client.get("/metrics")
+    assert response.status_code == 200
+    assert "http_requests_total" in response.text
+    assert REGISTRY.get_sample_value("user_management_active_users") == before
@@ -0,0 +1,76 @@
+def create_users(client, count, role="user"):
+    for i in range(count):
+        response = client.post("/users/", json={
+            "username": f"{role}{i}",
+            "email": f"{role}{i}@example.com",
+            "password": "secret",
+            "role": role,
+        })
+        assert response.status_code == 200
+
+
+def walk(client, **params):
+    """Follow X-Next-Cursor until the last page"""
+    pages = []
+    while True:
+        response = client.get("/users/", params=params)
+        assert response.status_code == 200
+        pages.append([u["id"] for u in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+        params = {**params, "cursor": cursor}
+
+
+def test_keyset_pages_cover_all_users(client):
+    """Test that pages are ordered, disjoint and complete"""
+    create_users(client, 7)
+    pages = walk(client, limit=3)
+    ids = [i for page in pages for i in page]
+
+    assert [len(p) for p in pages[:-1]] == [3] * (len(pages) - 1)
+    assert ids == sorted(ids)
+    assert len(ids) == len(set(ids)) == len(client.get("/users/", params={"limit": 1000}).json())
+
+
+def test_descending_order(client):
+    """Test ordering by -id and -created_at"""
+    create_users(client, 5)
+    for order in ("-id", "-created_at"):
+        ids = [i for page in walk(client, limit=2, order=order) for i in page]
+        assert ids == sorted(ids, reverse=True)
+
+
+def test_filters(client):
+    """Test server-side role, is_active and created date filters"""
+    create_users(client, 3, role="user")
+    create_users(client, 2, role="admin")
+    users = client.get("/users/", params={"role": "admin"}).json()
+    assert all(u["role"] == "admin" for u in users)
+    assert len(client.get("/users/", params={"role": "user"}).json()) == 3
+    assert len(client.get("/users/", params={"is_active": True}).json()) == 6
+    assert client.get("/users/", params={"is_active": False}).json() == []
+    assert client.get("/users/", params={"created_after": "2999-01-01T00:00:00"}).json() == []
+    assert client.get("/users/", params={"created_before": "2000-01-01T00:00:00"}).json() == []
+    assert len(client.get("/users/", params={"created_before": "2999-01-01T00:00:00"}).json()) == 6
+
+
+def test_created_at_cursor(client):
+    """Test that order=created_at pages follow (created_at, id)"""
+    create_users(client, 5)
+    users = []
+    params = {"limit": 2, "order": "created_at"}
+    while True:
+        response = client.get("/users/", params=params)
+        users.extend(response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    keys = [(u["created_at"], u["id"]) for u in users]
+    assert len(keys) == 6
+    assert keys == sorted(keys)
+
+
+def test_invalid_cursor(client):
+    """Test that a garbage cursor is rejected"""
+    assert client.get("/users/", params={"cursor": "not-a-cursor"}).status_code == 400
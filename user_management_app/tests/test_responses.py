@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from pydantic import TypeAdapter
+
+from responses import USER_FIELDS, users_response
+from routes.users import UserResponse
+
+
+def test_list_fields_projection(client):
+    """Test ?fields= limits list, search and single-user payloads"""
+    users = client.get("/users/", params={"fields": "id,username"}).json()
+    assert users == [{"id": 1, "username": "admin"}]
+
+    found = client.get("/users/search", params={"q": "adm", "fields": "username"}).json()
+    assert found == [{"username": "admin"}]
+
+    response = client.get("/users/1", params={"fields": "email, role"})
+    assert response.json() == {"email": "admin@example.com", "role": "admin"}
+    assert response.headers["ETag"] != client.get("/users/1").headers["ETag"]
+
+
+def test_full_records_have_public_fields_only(client):
+    user = client.get("/users/1").json()
+    assert tuple(user) == USER_FIELDS
+    login = client.post("/auth/login", json={"username": "admin", "password": "admin"}).json()
+    assert "password_hash" not in login and login["username"] == "admin"
+
+
+def test_unknown_field_rejected(client):
+    response = client.get("/users/", params={"fields": "id,password_hash"})
+    assert response.status_code == 400
+    assert "password_hash" in response.json()["detail"]
+
+
+def test_same_json_as_response_model():
+    """Test orjson output matches what UserResponse validation would produce"""
+    user = {"id": 7, "username": "u", "email": "u@example.com", "first_name": None, "role": "user",
+            "is_active": True, "created_at": datetime(2024, 5, 1, 12, 30, 0, 123456), "password_hash": "x"}
+    adapter = TypeAdapter(list[UserResponse])
+    expected = adapter.dump_json(adapter.validate_python([user]))
+    assert users_response([user]).body == expected
@@ -0,0 +1,73 @@
+import search
+from store import UserStore
+
+
+def seed_people(client):
+    client.post("/users/bulk", json=[
+        {"username": "ann", "email": "ann@example.com", "password": "pw", "first_name": "Ann", "last_name": "Lee"},
+        {"username": "annabel", "email": "bel@example.com", "password": "pw"},
+        {"username": "joe", "email": "annex@example.com", "password": "pw"},
+        {"username": "zed", "email": "zed@example.com", "password": "pw", "last_name": "Annan"},
+        {"username": "bob", "email": "bob@example.com", "password": "pw", "first_name": "Bob"},
+    ])
+    return {u["username"]: u["id"] for u in client.get("/users/").json()}
+
+
+def test_search_ranks_matches(client):
+    """Test exact, username, email and name matches in rank order"""
+    ids = seed_people(client)
+    response = client.get("/users/search", params={"q": "ANN"})
+    assert response.status_code == 200
+    users = response.json()
+    assert [u["username"] for u in users] == ["ann", "annabel", "joe", "zed"]
+    assert "password_hash" not in users[0]
+    assert users[0]["id"] == ids["ann"]
+
+
+def test_search_paginates(client):
+    """Test the (rank, id) cursor walks every match once"""
+    seed_people(client)
+    seen, cursor = [], None
+    while True:
+        params = {"q": "an", "limit": 1, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/users/search", params=params)
+        seen += [u["username"] for u in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == ["ann", "annabel", "joe", "zed"]
+
+
+def test_search_after_update_and_delete(client):
+    """Test the results follow renames and deletes"""
+    ids = seed_people(client)
+    client.put(f"/users/{ids['bob']}", json={"username": "annie", "email": "annie@example.com", "first_name": "Annie"})
+    client.delete(f"/users/{ids['annabel']}")
+    names = [u["username"] for u in client.get("/users/search", params={"q": "ann"}).json()]
+    assert names == ["ann", "annie", "joe", "zed"]
+    assert client.get("/users/search", params={"q": "bob"}).json() == []
+
+
+def test_search_rejects_bad_input(client):
+    assert client.get("/users/search", params={"q": "a"}).status_code == 422
+    assert client.get("/users/search", params={"q": " a "}).status_code == 400
+    assert client.get("/users/search", params={"q": "ann", "cursor": "bad"}).status_code == 400
+
+
+def test_sql_search_matches_substrings(sql_client):
+    """Test SQL backends also match infixes, ranked last, with LIKE wildcards escaped"""
+    seed_people(sql_client)
+    assert [u["username"] for u in sql_client.get("/users/search", params={"q": "nab"}).json()] == ["annabel"]
+    assert sql_client.get("/users/search", params={"q": "a%"}).json() == []
+
+
+def test_prefix_index_merges_away_stale_terms():
+    store = UserStore()
+    store._search.MERGE_THRESHOLD = 4
+    user = store.add({"username": "alice", "email": "alice@example.com"})
+    store.update(user["id"], {"username": "carol"})
+    for i in range(10):
+        store.add({"username": f"user{i}", "email": f"user{i}@example.com"})
+    assert [u["username"] for u in store.search("al")] == ["carol"]  # par l'email
+    assert ("alice", user["id"]) not in store._search._entries
+    assert search.escape_like("50%_\\") == "50\\%\\_\\\\"
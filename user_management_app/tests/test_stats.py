@@ -0,0 +1,25 @@
+def test_user_stats(client):
+    """Test aggregate counts and the most recent users"""
+    client.post("/users/bulk", json=[
+        {"username": f"user{i}", "email": f"user{i}@example.com", "password": "pw", "role": "user"}
+        for i in range(4)
+    ] + [{"username": "boss", "email": "boss@example.com", "password": "pw", "role": "admin"}])
+    client.delete("/users/2")
+
+    response = client.get("/users/stats", params={"recent": 3})
+    assert response.status_code == 200
+    stats = response.json()
+
+    assert stats["total"] == 5
+    assert stats["active"] == 5
+    assert stats["inactive"] == 0
+    assert stats["roles"] == {"admin": 2, "user": 3}
+    assert [u["username"] for u in stats["recent"]] == ["boss", "user3", "user2"]
+    assert all("password_hash" not in u for u in stats["recent"])
+
+
+def test_user_stats_without_recent(client):
+    """Test that recent=0 only returns the counters"""
+    stats = client.get("/users/stats", params={"recent": 0}).json()
+    assert stats["recent"] == []
+    assert stats["total"] == 1
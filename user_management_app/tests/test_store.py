@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from store import UserStore, DuplicateUserError
+
+
+def make_user(username, **extra):
+    user = {
+        "username": username,
+        "email": f"{username}@example.com",
+        "password_hash": "x",
+        "first_name": None,
+        "last_name": None,
+        "role": "user",
+        "is_active": True,
+    }
+    user.update(extra)
+    return user
+
+
+def test_store_indexes_lookup():
+    """Test lookups by id, username and email"""
+    store = UserStore()
+    user = store.add(make_user("alice"))
+
+    assert user["id"] == 1
+    assert store.get(1) is user
+    assert store.get_by_username("alice") is user
+    assert store.get_by_email("alice@example.com") is user
+    assert store.get_by_username("bob") is None
+
+
+def test_store_rejects_duplicates():
+    """Test that username and email must be unique"""
+    store = UserStore([make_user("alice")])
+
+    with pytest.raises(DuplicateUserError):
+        store.add(make_user("alice", email="other@example.com"))
+    with pytest.raises(DuplicateUserError):
+        store.add(make_user("bob", email="alice@example.com"))
+    assert len(store) == 1
+
+
+def test_store_ids_are_never_reused():
+    """Test that the id allocator stays monotonic after deletes"""
+    store = UserStore([make_user("admin", id=1)])
+    second = store.add(make_user("alice"))
+    assert store.delete(second["id"]) is second
+    assert store.delete(second["id"]) is None
+
+    third = store.add(make_user("bob"))
+    assert third["id"] == second["id"] + 1
+    assert store.get_by_username("alice") is None
+
+
+def test_store_active_count():
+    """Test the incrementally maintained active counter"""
+    store = UserStore([make_user("alice"), make_user("bob", is_active=False)])
+    assert store.active_count == 1
+    store.delete(1)
+    assert store.active_count == 0
+
+
+def test_store_concurrent_inserts():
+    """Test that concurrent inserts get distinct ids"""
+    store = UserStore()
+
+    def worker(offset):
+        for i in range(200):
+            store.add(make_user(f"user{offset}_{i}"))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ids = [u["id"] for u in store]
+    assert len(ids) == len(set(ids)) == 1600
+
+
+def test_store_copies_caller_dict():
+    """Test that mutating the inserted dict does not corrupt the indexes"""
+    seed = make_user("alice", id=1)
+    store = UserStore([seed])
+    seed["username"] = "mallory"
+
+    assert store.get(1)["username"] == "alice"
+    assert store.get_by_username("alice") is store.get(1)
+    assert store.get_by_username("mallory") is None
+
+
+def test_store_scan_by_created_at():
+    """Test that created_at order holds for caller-supplied timestamps"""
+    from datetime import datetime
+
+    store = UserStore([
+        make_user("late", id=1, created_at=datetime(2024, 3, 1)),
+        make_user("early", id=2, created_at=datetime(2024, 1, 1)),
+        make_user("middle", id=3, created_at=datetime(2024, 2, 1)),
+    ])
+
+    assert [u["username"] for u in store.scan(order="created_at")] == ["early", "middle", "late"]
+    after = (datetime(2024, 1, 1), 2)
+    assert [u["username"] for u in store.scan(after, order="created_at")] == ["middle", "late"]
+    assert [u["username"] for u in store.scan(after, descending=True, order="created_at")] == []
+    store.delete(3)
+    assert [u["id"] for u in store.scan(descending=True)] == [2, 1]
+
+
+def test_store_update_reindexes():
+    """Test that update moves indexes and counters"""
+    store = UserStore([make_user("alice"), make_user("bob")])
+    before = store.get(1)
+    updated = store.update(1, {"username": "alicia", "is_active": False, "role": "admin", "id": 42})
+
+    assert updated["id"] == 1
+    assert store.get_by_username("alicia") is updated
+    assert store.get_by_username("alice") is None
+    assert before["username"] == "alice"
+    assert store.stats() == {"total": 2, "active": 1, "roles": {"admin": 1, "user": 1}}
+    with pytest.raises(DuplicateUserError):
+        store.update(1, {"username": "bob"})
+    assert store.update(99, {"role": "x"}) is None
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from tokens import Denylist, TokenError, TokenService
+
+
+def login(client):
+    response = client.post("/auth/login", json={"username": "admin", "password": "admin"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def new_user(name):
+    return {"username": name, "email": f"{name}@example.com", "password": "pw"}
+
+
+def test_login_tokens_authorize_admin_routes(client):
+    """Test the login tokens, and that create and delete require an admin token"""
+    body = login(client)
+    assert body["username"] == "admin" and body["token_type"] == "bearer"
+    client.headers.pop("Authorization")
+
+    missing = client.post("/users/", json=new_user("alice"))
+    assert missing.status_code == 401 and missing.headers["WWW-Authenticate"] == "Bearer"
+    assert client.post("/users/", json=new_user("alice"), headers=bearer("not-a-jwt")).status_code == 401
+    created = client.post("/users/", json=new_user("alice"), headers=bearer(body["access_token"]))
+    assert created.status_code == 200
+
+    alice = login_as(client, "alice")
+    assert client.delete("/users/1", headers=bearer(alice["access_token"])).status_code == 403
+    # Le refresh token n'ouvre pas les routes protégées
+    assert client.delete("/users/1", headers=bearer(body["refresh_token"])).status_code == 401
+
+
+def login_as(client, username):
+    return client.post("/auth/login", json={"username": username, "password": "pw"}).json()
+
+
+def test_update_requires_an_admin_token(client):
+    """Test PUT /users/{id} is gated like the other writes: no role change without admin"""
+    client.post("/users/", json=new_user("dave"))
+    dave = login_as(client, "dave")
+    client.headers.pop("Authorization")
+    assert client.put(f"/users/{dave['id']}", json={"role": "admin"}).status_code == 401
+    response = client.put(f"/users/{dave['id']}", json={"role": "admin"}, headers=bearer(dave["access_token"]))
+    assert response.status_code == 403
+    assert client.get(f"/users/{dave['id']}").json()["role"] == "user"
+
+
+def test_refresh_rotates_and_logout_revokes(client):
+    body = login(client)
+    refreshed = client.post("/auth/refresh", json={"refresh_token": body["refresh_token"]})
+    assert refreshed.status_code == 200
+    # Rotation: l'ancien refresh token est révoqué
+    assert client.post("/auth/refresh", json={"refresh_token": body["refresh_token"]}).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": body["access_token"]}).status_code == 401
+
+    access = refreshed.json()["access_token"]
+    assert client.post("/auth/logout", headers=bearer(access)).status_code == 200
+    assert client.post("/users/", json=new_user("bob"), headers=bearer(access)).status_code == 401
+
+
+def test_deleting_a_user_revokes_their_tokens(client):
+    client.post("/users/", json=new_user("carol"))
+    carol = login_as(client, "carol")
+    user_id = carol["id"]
+    assert client.delete(f"/users/{user_id}").status_code == 200
+    assert client.post("/auth/refresh", json={"refresh_token": carol["refresh_token"]}).status_code == 401
+
+
+def test_key_rotation_and_expiry():
+    # jose vérifie exp avec l'horloge réelle
+    now = [time.time()]
+    old = TokenService(keys=[("k1", "old-secret")], clock=lambda: now[0])
+    rotated = TokenService(keys=[("k2", "new-secret"), ("k1", "old-secret")], clock=lambda: now[0])
+    retired = TokenService(keys=[("k2", "new-secret")], clock=lambda: now[0])
+    user = {"id": 5, "role": "user"}
+
+    token = old.issue(user)["access_token"]
+    assert rotated.verify(token)["sub"] == "5"
+    with pytest.raises(TokenError, match="unknown_key"):
+        retired.verify(token)
+    assert retired.verify(rotated.issue(user)["access_token"])["role"] == "user"
+
+    now[0] -= old.access_ttl + 1
+    with pytest.raises(TokenError, match="expired"):
+        rotated.verify(old.issue(user)["access_token"])
+
+
+def test_denylist_forgets_expired_entries():
+    now = [100.0]
+    denylist = Denylist(clock=lambda: now[0])
+    denylist.PURGE_EVERY = 2
+    denylist.revoke("a", exp=150)
+    assert denylist.is_revoked({"jti": "a", "sub": "1", "iat": 90})
+    now[0] = 200
+    denylist.revoke("b", exp=300)
+    assert len(denylist) == 1
+    assert not denylist.is_revoked({"jti": "a", "sub": "1", "iat": 90})
+
+
+def test_missing_keys_refuse_to_start():
+    """Test the API does not fall back to the public development key"""
+    env = {k: v for k, v in os.environ.items() if k not in ("JWT_KEYS", "JWT_DEV_KEYS")}
+    api_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+    result = subprocess.run([sys.executable, "-c", "import tokens"], cwd=api_dir, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0 and "JWT_KEYS is not set" in result.stderr
@@ -0,0 +1,80 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from user_cache import CachedBackend, UserCache
+
+
+def user(user_id, username):
+    return {"id": user_id, "username": username, "email": f"{username}@example.com", "password_hash": "h"}
+
+
+def counter(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_user_cache_lru_and_ttl():
+    """Test size-bounded LRU eviction, TTL expiry and the username index"""
+    now = [0.0]
+    cache = UserCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.store(user(1, "a"), cache.generation)
+    cache.store(user(2, "b"), cache.generation)
+    assert cache.lookup(user_id=1)[0]["username"] == "a"
+    cache.store(user(3, "c"), cache.generation)
+
+    assert cache.lookup(user_id=2) is None
+    assert cache.lookup(username="b") is None
+    assert cache.lookup(username="a") == ({"id": 1, "username": "a", "email": "a@example.com"}, "h")
+
+    now[0] = 11
+    assert cache.lookup(user_id=1) is None
+    assert cache.lookup(username="c") is None
+
+
+def test_user_cache_skips_stale_loads():
+    """Test that a read started before an invalidation is not cached"""
+    cache = UserCache()
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.store(user(1, "a"), generation)
+    assert cache.lookup(user_id=1) is None
+
+
+@pytest.fixture
+def cached_client(sql_backend):
+    from conftest import backend_client
+
+    yield from backend_client(CachedBackend(sql_backend))
+
+
+def test_cached_backend_reads_and_invalidation(cached_client):
+    """Test hits, invalidation on writes and that password_hash never leaks"""
+    misses, hits = counter("user_cache_misses_total", key="id"), counter("user_cache_hits_total", key="id")
+    first = cached_client.get("/users/1")
+    second = cached_client.get("/users/1")
+    assert first.json() == second.json()
+    assert "password_hash" not in second.json()
+    assert counter("user_cache_misses_total", key="id") == misses + 1
+    assert counter("user_cache_hits_total", key="id") == hits + 1
+
+    assert cached_client.put("/users/1", json={"first_name": "Root"}).status_code == 200
+    assert cached_client.get("/users/1").json()["first_name"] == "Root"
+
+    # Login servi depuis le cache par username, hash compris (le premier login réécrit le hash)
+    for _ in range(2):
+        assert cached_client.post("/auth/login", json={"username": "admin", "password": "admin"}).status_code == 200
+    username_hits = counter("user_cache_hits_total", key="username")
+    assert cached_client.post("/auth/login", json={"username": "admin", "password": "admin"}).status_code == 200
+    assert counter("user_cache_hits_total", key="username") == username_hits + 1
+
+    assert cached_client.delete("/users/1").status_code == 200
+    assert cached_client.get("/users/1").status_code == 404
+    assert cached_client.post("/auth/login", json={"username": "admin", "password": "admin"}).status_code == 401
+
+
+def test_cached_backend_bulk_writes_invalidate(cached_client):
+    """Test that set-based updates drop the cached users they touched"""
+    assert cached_client.get("/users/1").json()["is_active"] is True
+    cached_client.post("/users/bulk/update", json={"filter": {"ids": [1]}, "changes": {"is_active": False}})
+    assert cached_client.get("/users/1").json()["is_active"] is False
+    cached_client.post("/users/bulk/delete", json={"filter": {"ids": [1]}})
+    assert cached_client.get("/users/1").status_code == 404